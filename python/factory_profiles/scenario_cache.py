@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+from typing import Optional
+
+from factory_profiles.scenario_factory_profiles import generate_scenario
+from lib.instrumentation import count
+from lib.topology import Topology
+
+GENERATOR_VERSION = 2
+"""
+Part of every cache key; increase it whenever a change to the factories alters the generated scenarios,
+or a change to Topology.__getstate__() alters the pickled form.
+"""
+
+
+class ScenarioCache(object):
+    """
+    Content-addressed on-disk cache of generated scenarios.
+
+    Entries are keyed by a hash of (generator version, profile, size, seed, further parameters) and stored as pickled
+    Topology (see Topology.__getstate__). When the directory grows beyond max_bytes, the least recently used
+    entries are evicted. Several processes may share one directory.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 2**30) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(profile: str, size: str = None, seed: int = None, **params) -> str:
+        if profile == "automotive":
+            size = None  # the automotive profile has no sizes, all of them yield the same scenario
+        description = {"version": GENERATOR_VERSION, "profile": profile, "size": size, "seed": seed, "params": params}
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pickle"
+
+    def get(self, key: str) -> Optional[Topology]:
+        path = self._path(key)
+        try:
+            os.utime(path)  # mark as recently used
+            with open(path, "rb") as file:
+                return pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            # missing, evicted concurrently or still being replaced
+            return None
+
+    def put(self, key: str, topo: Topology) -> None:
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as file:
+            pickle.dump(topo, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def generate(self, profile: str, size: str = None, seed: int = None, utilization_target: float = None) -> Topology:
+        """
+        Cached version of factory_profiles.generate_scenario(); only seeded scenarios are cached.
+        """
+        if seed == None:
+            return generate_scenario(profile, size, seed, utilization_target)
+
+        params = {} if utilization_target == None else {"utilization_target": utilization_target}
+        key = self.key(profile, size, seed, **params)
+        topo = self.get(key)
+        if topo != None:
+            self.hits += 1
+            count("cache_hits")
+            return topo
+
+        self.misses += 1
+        count("cache_misses")
+        topo = generate_scenario(profile, size, seed, utilization_target)
+        self.put(key, topo)
+        return topo
+
+    def evict(self) -> None:
+        entries = []
+        for path in self.directory.glob("*.pickle"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # evicted concurrently
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        for path in self.directory.glob("*.pickle"):
+            path.unlink(missing_ok=True)
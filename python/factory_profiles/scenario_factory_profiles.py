@@ -1,15 +1,22 @@
 import random
 from typing import Literal
 
+from lib.instrumentation import timed, count
+from lib.stream import Stream
 from lib.topology import Topology, Host, Controller
 from lib.y_random_util import unpack_random as ur, urandom_float_between
+from stream_factory.admission import StreamAdmission
 from stream_factory.create_streams import create_streams_for_topology
 from topology_factory.combine_topologies import combine_topologies
 from topology_factory.linear_branches import linear_branches
 from topology_factory.two_layer_tree import two_layer_tree
 
 
-def industrial_scenario(size: Literal["small", "medium", "big"]) -> Topology:
+@timed()
+def industrial_scenario(size: Literal["small", "medium", "big"], utilization_target: float = None) -> Topology:
+    """
+    :param utilization_target: only generate streams that keep every link below this utilization, see StreamAdmission
+    """
     sizes = ["small", "medium", "big"]
     if size not in sizes:
         raise ValueError(f"size may only be one of {sizes}, not '{size}'")
@@ -19,13 +26,14 @@ def industrial_scenario(size: Literal["small", "medium", "big"]) -> Topology:
     if size == "small":
         topo = linear_branches(main_length=[2,5], branches_per_main_switch=1, branch_length=[1,3], hosts_per_branch_switch=[3,6], main_link_speed=1e9, branch_link_speed=1e8, connect_to_ring={True, False}, num_join_points=2)
 
+        admission = StreamAdmission(topo, utilization_target) if utilization_target != None else None
         streams = []
-        streams += create_streams_for_topology(topo, num_streams=30, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], max_pathlen=2)
-        streams += create_streams_for_topology(topo, num_streams=30, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=3, max_pathlen=3)
-        streams += create_streams_for_topology(topo, num_streams=20,  burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=4, max_pathlen=4)
-        streams += create_streams_for_topology(topo, num_streams=15,  burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=5, max_pathlen=5)
-        streams += create_streams_for_topology(topo, num_streams=10,  burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=6, max_pathlen=6)
-        streams += create_streams_for_topology(topo, num_streams=5,  burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=7, max_pathlen=7)
+        streams += create_streams_for_topology(topo, num_streams=30, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], max_pathlen=2, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=30, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=3, max_pathlen=3, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=20,  burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=4, max_pathlen=4, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=15,  burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=5, max_pathlen=5, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=10,  burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=6, max_pathlen=6, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=5,  burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=7, max_pathlen=7, admission=admission)
         topo.add_streams(streams)
 
 
@@ -38,11 +46,13 @@ def industrial_scenario(size: Literal["small", "medium", "big"]) -> Topology:
             num_branches += 1
 
             join_points = ur([1,2])
-            while join_points > main_length: join_points = ur([1,2])
+            while join_points > main_length:
+                count("join_point_retries")
+                join_points = ur([1,2])
             main_length -= join_points
 
             topo2 = linear_branches(main_length=[2,4], branches_per_main_switch=1, branch_length=[1,3], hosts_per_branch_switch=[3,6], main_link_speed=1e9, branch_link_speed=1e8, connect_to_ring={True, False}, num_join_points=join_points).reset_with_prefix(f"r{num_branches}_")
-            topo = combine_topologies(topo, topo2, add_name_prefixes=False, removeJoinPointsUsed=True, removeJoinPointsTopo2=True)
+            topo = combine_topologies(topo, topo2, add_name_prefixes=False, removeJoinPointsUsed=True, removeJoinPointsTopo2=True, in_place=True)
 
         # Connect 2 dangling switches with chance 10%
         if urandom_float_between(0, 1) >= 0.1:
@@ -53,13 +63,14 @@ def industrial_scenario(size: Literal["small", "medium", "big"]) -> Topology:
                 print(f"    --> {n1.name}, {n2.name}")
                 n1.addNeigh(n2, 1e8)
 
+        admission = StreamAdmission(topo, utilization_target) if utilization_target != None else None
         streams = []
-        streams += create_streams_for_topology(topo, num_streams=70, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], max_pathlen=2)
-        streams += create_streams_for_topology(topo, num_streams=50, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=3, max_pathlen=3)
-        streams += create_streams_for_topology(topo, num_streams=40, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=4, max_pathlen=4)
-        streams += create_streams_for_topology(topo, num_streams=30, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=5, max_pathlen=5)
-        streams += create_streams_for_topology(topo, num_streams=20, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=6, max_pathlen=6)
-        streams += create_streams_for_topology(topo, num_streams=10, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=7, max_pathlen=7)
+        streams += create_streams_for_topology(topo, num_streams=70, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], max_pathlen=2, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=50, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=3, max_pathlen=3, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=40, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=4, max_pathlen=4, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=30, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=5, max_pathlen=5, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=20, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=6, max_pathlen=6, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=10, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=7, max_pathlen=7, admission=admission)
         topo.add_streams(streams)
 
 
@@ -68,7 +79,7 @@ def industrial_scenario(size: Literal["small", "medium", "big"]) -> Topology:
         topo = linear_branches(main_length=main_length, branches_per_main_switch=0, branch_length=0, hosts_per_branch_switch=0, main_link_speed=1e10, branch_link_speed=1e9, connect_to_ring=True, num_join_points=main_length)
 
         topo2 = two_layer_tree(num_layer1_switches=2, num_layer2_switches=[3,5], hosts_per_l2switch=[4,16], switch_link_speed=1e10, host_link_speed=1e9).reset_with_prefix("tree_")
-        topo = combine_topologies(topo, topo2, add_name_prefixes=False, removeJoinPointsUsed=True, removeJoinPointsTopo2=True)
+        topo = combine_topologies(topo, topo2, add_name_prefixes=False, removeJoinPointsUsed=True, removeJoinPointsTopo2=True, in_place=True)
         main_length -= 2
 
         num_branches = -1
@@ -76,11 +87,13 @@ def industrial_scenario(size: Literal["small", "medium", "big"]) -> Topology:
             num_branches += 1
 
             join_points = ur([1,2])
-            while join_points > main_length: join_points = ur([1,2])
+            while join_points > main_length:
+                count("join_point_retries")
+                join_points = ur([1,2])
             main_length -= join_points
 
             topo2 = linear_branches(main_length=[2,5], branches_per_main_switch=[1,2], branch_length=[1,4], hosts_per_branch_switch=[3,6], main_link_speed=ur({1e9, 2.5e9}), branch_link_speed=1e8, connect_to_ring={True, False}, num_join_points=join_points).reset_with_prefix(f"r{num_branches}_")
-            topo = combine_topologies(topo, topo2, add_name_prefixes=False, removeJoinPointsUsed=True, removeJoinPointsTopo2=True)
+            topo = combine_topologies(topo, topo2, add_name_prefixes=False, removeJoinPointsUsed=True, removeJoinPointsTopo2=True, in_place=True)
 
         # Connect 2 dangling switches with chance 50%
         if urandom_float_between(0, 1) >= 0.5:
@@ -91,13 +104,14 @@ def industrial_scenario(size: Literal["small", "medium", "big"]) -> Topology:
                 print(f"    --> {n1.name}, {n2.name}")
                 n1.addNeigh(n2, 1e8)
 
+        admission = StreamAdmission(topo, utilization_target) if utilization_target != None else None
         streams = []
-        streams += create_streams_for_topology(topo, num_streams=100, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], max_pathlen=2)
-        streams += create_streams_for_topology(topo, num_streams=100, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=3, max_pathlen=3)
-        streams += create_streams_for_topology(topo, num_streams=80, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=4, max_pathlen=4)
-        streams += create_streams_for_topology(topo, num_streams=60, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=5, max_pathlen=5)
-        streams += create_streams_for_topology(topo, num_streams=50, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=6, max_pathlen=6)
-        streams += create_streams_for_topology(topo, num_streams=40, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=7, max_pathlen=7)
+        streams += create_streams_for_topology(topo, num_streams=100, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], max_pathlen=2, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=100, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=3, max_pathlen=3, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=80, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=4, max_pathlen=4, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=60, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=5, max_pathlen=5, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=50, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=6, max_pathlen=6, admission=admission)
+        streams += create_streams_for_topology(topo, num_streams=40, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], min_pathlen=7, max_pathlen=7, admission=admission)
         topo.add_streams(streams)
 
 
@@ -106,7 +120,11 @@ def industrial_scenario(size: Literal["small", "medium", "big"]) -> Topology:
 
 
 
-def automotive_scenario():
+@timed()
+def automotive_scenario(utilization_target: float = None):
+    """
+    :param utilization_target: only generate streams that keep every link below this utilization, see StreamAdmission
+    """
     topo = linear_branches(main_length=[4, 6], branches_per_main_switch=1, branch_length=[4, 8], hosts_per_branch_switch=[2, 20, "log"], main_link_speed=10e9, branch_link_speed=1e9, connect_to_ring={True, False}, num_join_points=0)
     main_switches = [n for n in topo.nodes if "main_sw" in n.name]
     for n in main_switches:
@@ -130,6 +148,27 @@ def automotive_scenario():
             print(f"    --> {n1.name}, {n2.name}")
             n1.addNeigh(n2, 1e9)
 
-    topo.add_streams(create_streams_for_topology(topo, num_streams=2*len(topo.sensors), burst_range=[64*8, 512*8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], only_switch_controller_paths=True))
+    topo.add_streams(create_streams_for_topology(topo, num_streams=2*len(topo.sensors), burst_range=[64*8, 512*8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7], only_switch_controller_paths=True, utilization_target=utilization_target))
 
     return topo
+
+
+PROFILES = ("industrial", "automotive")
+
+
+def generate_scenario(profile: Literal["industrial", "automotive"], size: Literal["small", "medium", "big"] = None, seed: int = None, utilization_target: float = None) -> Topology:
+    """
+    Generates one scenario of the given profile, reproducibly if a seed is given.
+
+    The seed initializes the global `random` state (which also seeds the NumPy generators used by the stream factory),
+    and stream ids restart at 0, so the same (profile, size, seed) always yields the same scenario.
+    """
+    if seed != None:
+        random.seed(seed)
+        Stream.LAST_ID = -1
+
+    if profile == "industrial":
+        return industrial_scenario(size, utilization_target)
+    elif profile == "automotive":
+        return automotive_scenario(utilization_target)
+    raise ValueError(f"profile may only be one of {PROFILES}, not '{profile}'")
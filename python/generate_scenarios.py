@@ -0,0 +1,146 @@
+import argparse
+import contextlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from factory_profiles.scenario_cache import ScenarioCache
+from factory_profiles.scenario_factory_profiles import generate_scenario, PROFILES
+from import_export.json import to_json
+from lib.fingerprint import topology_fingerprint
+from lib.instrumentation import Report, collect
+
+
+def scenario_seeds(master_seed: int, count: int) -> List[int]:
+    """
+    Derives independent 64 bit seeds for `count` scenarios from one master seed.
+    Scenario i gets the same seed regardless of count, number of workers or scheduling.
+    """
+    return [int(child.generate_state(1, dtype=np.uint64)[0]) for child in np.random.SeedSequence(master_seed).spawn(count)]
+
+
+def retry_seed(master_seed: int, index: int, attempt: int) -> int:
+    """
+    Seed of the attempt-th regeneration (attempt >= 1) of scenario index, e.g. after it turned out to be a duplicate;
+    independent of the seeds from scenario_seeds()
+    """
+    return int(np.random.SeedSequence(master_seed, spawn_key=(index, attempt)).generate_state(1, dtype=np.uint64)[0])
+
+
+def scenario_filename(profile: str, size: str, index: int, seed: int) -> str:
+    name = profile if profile == "automotive" else f"{profile}-{size}"
+    return f"{name}-{index:05d}-{seed}.json"
+
+
+TMP_SUFFIX = ".tmp"
+
+
+def generate_to_file(task: Tuple[str, str, int, int, str, bool, str, int, bool, Optional[bool], Optional[float]]) -> Tuple[int, int, str, int, int, Optional[dict], Optional[str]]:
+    """
+    The last task entry enables deduplication (None: off, otherwise whether streams are part of the fingerprint);
+    with deduplication, the scenario is written to path + TMP_SUFFIX and the main process keeps or removes it.
+
+    returns (index, seed, path, number of nodes, number of streams, instrumentation report or None, fingerprint or None)
+    """
+    profile, size, index, seed, output_dir, verbose, cache_dir, cache_size, report, dedup_streams, utilization_target = task
+    generate = ScenarioCache(cache_dir, cache_size).generate if cache_dir != None else generate_scenario
+
+    with collect() if report else contextlib.nullcontext() as r:
+        if verbose:
+            topo = generate(profile, size, seed, utilization_target)
+        else:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                topo = generate(profile, size, seed, utilization_target)
+
+        path = str(Path(output_dir) / scenario_filename(profile, size, index, seed))
+        if dedup_streams == None:
+            fingerprint = None
+            to_json(topo, path)
+        else:
+            fingerprint = topology_fingerprint(topo, include_streams=dedup_streams)
+            to_json(topo, path + TMP_SUFFIX)
+
+    return index, seed, path, len(topo.nodes), topo.num_streams, r.to_json_dict() if report else None, fingerprint
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Generate a batch of TSN problem scenarios in parallel.")
+    parser.add_argument("--profile", choices=PROFILES, default="industrial")
+    parser.add_argument("--size", choices=["small", "medium", "big"], default="small", help="ignored for the automotive profile")
+    parser.add_argument("--count", type=int, default=1, help="number of scenarios")
+    parser.add_argument("--seed", type=int, default=0, help="master seed, every scenario gets its own seed derived from it")
+    parser.add_argument("--scenario-seed", type=int, default=None, help="reproduce exactly one scenario from the seed in its filename")
+    parser.add_argument("--output-dir", default="/tmp/problem_gen/batch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes (default: all cores)")
+    parser.add_argument("--verbose", action="store_true", help="show the output of the scenario factories")
+    parser.add_argument("--cache-dir", default=None, help="reuse previously generated scenarios from this directory")
+    parser.add_argument("--cache-size", type=int, default=2**30, help="cache size limit in bytes")
+    parser.add_argument("--report", default=None, help="write phase times and counters of all scenarios as JSON to this file")
+    parser.add_argument("--dedup", choices=["off", "drop", "regenerate"], default="off", help="drop structurally identical scenarios, or replace them by newly seeded ones")
+    parser.add_argument("--dedup-streams", action="store_true", help="scenarios only count as duplicates if their streams are identical, too")
+    parser.add_argument("--utilization-target", type=float, default=None, help="only generate streams that keep every link below this utilization (e.g. 0.8)")
+    parser.add_argument("--max-attempts", type=int, default=10, help="regenerations per scenario with --dedup regenerate")
+    args = parser.parse_args(args)
+
+    if args.scenario_seed != None:
+        seeds = [args.scenario_seed]
+    else:
+        seeds = scenario_seeds(args.seed, args.count)
+    dedup_streams = None if args.dedup == "off" else args.dedup_streams
+
+    def task(index: int, seed: int) -> tuple:
+        return (args.profile, args.size, index, seed, args.output_dir, args.verbose, args.cache_dir, args.cache_size, args.report != None, dedup_streams, args.utilization_target)
+
+    tasks = [task(i, seed) for i, seed in enumerate(seeds)]
+
+    report = Report()
+    fingerprints = set()
+    written = duplicates = 0
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        # results are checked in task order, so the kept scenarios do not depend on the scheduling;
+        # regenerated scenarios are checked in the next round
+        attempt = 0
+        while len(tasks) > 0:
+            retries = []
+            chunksize = max(1, len(tasks) // (4 * (args.workers or 1)))
+            for index, seed, path, num_nodes, num_streams, scenario_report, fingerprint in executor.map(generate_to_file, tasks, chunksize=chunksize):
+                if scenario_report != None:
+                    report.merge(Report.from_json_dict(scenario_report))
+
+                if fingerprint in fingerprints:
+                    os.remove(path + TMP_SUFFIX)
+                    duplicates += 1
+                    if args.dedup == "regenerate" and attempt < args.max_attempts:
+                        retries.append(task(index, retry_seed(args.seed, index, attempt + 1)))
+                        print(f"scenario {index} (seed {seed}) is a duplicate, regenerating")
+                    else:
+                        print(f"scenario {index} (seed {seed}) is a duplicate, dropped")
+                    continue
+
+                if fingerprint != None:
+                    fingerprints.add(fingerprint)
+                    os.replace(path + TMP_SUFFIX, path)
+                written += 1
+                print(f"[{written}/{len(seeds)}] scenario {index} (seed {seed}): {num_nodes} nodes, {num_streams} streams -> {path}")
+
+            tasks = retries
+            attempt += 1
+
+    print(f"Generated {written} scenarios in {time.time() - start:.1f}s" + (f", {duplicates} duplicates" if args.dedup != "off" else ""))
+
+    if args.report != None:
+        Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.report, "w") as file:
+            json.dump(report.to_json_dict(), file, indent=4)
+        print(report)
+        print(f"Wrote report to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
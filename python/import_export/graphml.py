@@ -1,16 +1,112 @@
-from lib.topology import Topology
+import io
+from pathlib import Path
+from typing import BinaryIO, Union
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape, quoteattr
 
+from lib.topology import Topology, Node
 
-def from_graphml(graphml_format: str) -> Topology:
+GRAPHML_NS = "http://graphml.graphdrawing.org/xmlns"
+
+# GraphML attributes written by to_graphml() and understood by from_graphml() (matched by attr.name)
+NODE_KEYS = (("type", "string"), ("joinPoint", "boolean"))
+EDGE_KEYS = (("bandwidth", "double"),)
+
+
+def from_graphml(graphml_format: str, default_node_type: str = "switch", default_bandwidth: float = 1e9) -> Topology:
+    """
+    :param graphml_format: the GraphML document itself, see from_graphml_file() for files
+    """
+    return from_graphml_file(io.BytesIO(graphml_format.encode("utf-8")), default_node_type, default_bandwidth)
+
+
+def from_graphml_file(source: Union[str, BinaryIO], default_node_type: str = "switch", default_bandwidth: float = 1e9) -> Topology:
+    """
+    Reads a GraphML graph incrementally (iterparse, processed elements are discarded), so large files load in bounded memory.
+
+    Node ids become node names ('-' is replaced by '_', as node names may not contain it),
+    the node attributes "type" and "joinPoint" and the edge attribute "bandwidth" (in Bit/s) are used if present.
+    Edges are undirected, i.e. each edge becomes a pair of links.
+
+    :param default_node_type: type of nodes without a "type" attribute
+    :param default_bandwidth: bandwidth of edges without a "bandwidth" attribute
+    """
     topo = Topology()
+    keys = {}  # key id -> attr.name
+    pending_edges = []
+    graph = None
+
+    def tag(elem) -> str:
+        return elem.tag.rsplit("}", 1)[-1]
 
-    for l in graphml_format.split("\n"):
-        pass
+    def node_name(id: str) -> str:
+        return id.replace("-", "_")
 
-    # TODO
+    def add_edge(n1: str, n2: str, bandwidth: float) -> None:
+        topo.get_node_by_name(n1).addNeigh(topo.get_node_by_name(n2), bandwidth)
+
+    for event, elem in iterparse(source, events=("start", "end")):
+        t = tag(elem)
+        if event == "start":
+            if t == "graph" and graph is None:
+                graph = elem
+            continue
+
+        if t == "key":
+            keys[elem.get("id")] = elem.get("attr.name", elem.get("id"))
+        elif t == "node":
+            data = {keys.get(d.get("key"), d.get("key")): (d.text or "").strip() for d in elem if tag(d) == "data"}
+            topo.add_node(Node(node_name(elem.get("id")), data.get("type", default_node_type), joinPoint=data.get("joinPoint", "false").lower() == "true"))
+        elif t == "edge":
+            data = {keys.get(d.get("key"), d.get("key")): (d.text or "").strip() for d in elem if tag(d) == "data"}
+            n1, n2 = node_name(elem.get("source")), node_name(elem.get("target"))
+            bandwidth = float(data["bandwidth"]) if "bandwidth" in data else default_bandwidth
+            # GraphML allows edges before the nodes they connect
+            try:
+                add_edge(n1, n2, bandwidth)
+            except ValueError:
+                pending_edges.append((n1, n2, bandwidth))
+        else:
+            continue
+
+        # drop everything processed so far
+        elem.clear()
+        if graph is not None and t in ("node", "edge"):
+            graph.clear()
+
+    for n1, n2, bandwidth in pending_edges:
+        add_edge(n1, n2, bandwidth)
 
     return topo
 
 
 def to_graphml(topo: Topology, path: str):
-    pass
+    """
+    Writes the topology as undirected GraphML, element by element without building a document tree.
+    Each pair of links becomes one edge; edges are written in link creation order, so from_graphml() restores the ports.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8", buffering=2**20) as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        file.write(f'<graphml xmlns="{GRAPHML_NS}">\n')
+        for name, type in NODE_KEYS:
+            file.write(f'  <key id="{name}" for="node" attr.name="{name}" attr.type="{type}"/>\n')
+        for name, type in EDGE_KEYS:
+            file.write(f'  <key id="{name}" for="edge" attr.name="{name}" attr.type="{type}"/>\n')
+        file.write('  <graph id="G" edgedefault="undirected">\n')
+
+        for n in topo.nodes:
+            file.write(f'    <node id={quoteattr(n.name)}><data key="type">{escape(n.type)}</data>')
+            if n.joinPoint:
+                file.write('<data key="joinPoint">true</data>')
+            file.write('</node>\n')
+
+        written = set()
+        for l in topo.links:
+            if (l.n2.index, l.n1.index) in written:
+                continue
+            written.add((l.n1.index, l.n2.index))
+            file.write(f'    <edge source={quoteattr(l.n1.name)} target={quoteattr(l.n2.name)}><data key="bandwidth">{float(l.bandwidth)!r}</data></edge>\n')
+
+        file.write('  </graph>\n')
+        file.write('</graphml>\n')
@@ -1,15 +1,301 @@
+import gzip
+import io
 import json
 from json import JSONEncoder
 from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Literal, TextIO, Tuple
 
+import numpy as np
+
+from lib.instrumentation import timed
 from lib.stream import Stream
+from lib.stream_table import StreamTable
 from lib.topology import Topology, Node, Link
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
-def to_json(topo: Topology, path: str):
+@timed()
+def to_json(topo: Topology, path: str, indent: int = 4, compression: Literal["gzip", "zstd"] = None, encoder: Literal["json", "orjson"] = None):
+    """
+    Writes the topology (see Topology.to_json_dict()) incrementally, one node/link/stream at a time.
+
+    :param indent: None for compact output without whitespace
+    :param compression: "gzip" or "zstd" (requires `zstandard`); by default derived from the file suffix (.gz, .zst)
+    :param encoder: "orjson" (requires `orjson`, only for compact output or indent=2) or "json";
+        by default orjson is used whenever possible
+    """
     Path(path).parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w") as file:
-        json.dump(topo.to_json_dict(), file, indent=4, cls=MyEncoder)
+    with open_compressed(path, "wb", compression) as file:
+        write_json_sections(file, [
+            ("nodes", (n.to_json_dict() for n in topo.nodes)),
+            ("links", (l.to_json_dict() for l in topo.links)),
+            ("streams", topo.stream_json_dicts_sorted()),
+        ], indent, encoder)
+
+
+@timed()
+def from_json(path: str, streaming: bool = False, as_table: bool = False, compression: Literal["gzip", "zstd"] = None) -> Topology:
+    """
+    Loads a topology written by to_json(), including its streams (with their original ids and labels).
+
+    Links are recreated in file order, which reproduces the original port numbering,
+    and stream paths are resolved via the topology's link index instead of shortest_path().
+
+    :param streaming: parse the file incrementally (bounded memory besides the topology itself)
+    :param as_table: load the streams into a StreamTable instead of Stream objects (faster and smaller for many streams)
+    :param compression: see to_json()
+    """
+    with open_compressed(path, "rb", compression) as file:
+        if streaming:
+            return from_json_items(iter_json_sections(io.TextIOWrapper(file, encoding="utf-8")), as_table)
+        data = orjson.loads(file.read()) if orjson != None else json.load(file)
+    return from_json_dict(data, as_table)
+
+
+def from_json_dict(data: dict, as_table: bool = False) -> Topology:
+    """
+    Inverse of Topology.to_json_dict() (with nodes, links and streams encoded as dicts)
+    """
+    return from_json_items(((key, item) for key in ("nodes", "links", "streams") for item in data.get(key, [])), as_table)
+
+
+def from_json_items(items: Iterable[Tuple[str, dict]], as_table: bool = False) -> Topology:
+    """
+    Builds a topology from ("nodes" | "links" | "streams", item) pairs; nodes must precede the links and streams using them.
+    """
+    topo = Topology()
+    nodes = topo._nodes_by_name
+    links = topo._links_by_pair
+    streams = _JsonStreamCollector(topo)
+
+    for key, item in items:
+        if key == "nodes":
+            topo.add_node(Node(item["name"], item["type"]))
+        elif key == "links":
+            n1 = nodes[item["n1"]]
+            n2 = nodes[item["n2"]]
+            # the mirrored link was already created together with its counterpart
+            if (n2.index, n1.index) not in links:
+                n1.addNeigh(n2, item["bandwidth"])
+        elif key == "streams":
+            try:
+                link_ids = _link_ids(item["path"], nodes, links)
+                alternatives = [_link_ids(p, nodes, links) for p in item.get("alternativePaths", ())]
+            except KeyError:
+                raise ValueError(f"path of stream {item['label']} uses a link that does not exist") from None
+            streams.append(item, link_ids, alternatives)
+
+    topo.add_streams(streams.to_table() if as_table else streams.to_streams())
+    return topo
+
+
+def _link_ids(names: List[str], nodes: dict, links: dict) -> List[int]:
+    path = [nodes[name].index for name in names]
+    return [links[(path[i - 1], path[i])].index for i in range(1, len(path))]
+
+
+class _JsonStreamCollector(object):
+    def __init__(self, topo: Topology) -> None:
+        self._topo = topo
+        self._items = []
+        self._paths = []
+        self._alternatives = {}
+        """
+        position in _items -> alternative paths (link ids), only for streams that have some
+        """
+
+    def append(self, item: dict, link_ids: list, alternatives: list = ()) -> None:
+        if len(alternatives) > 0:
+            self._alternatives[len(self._items)] = alternatives
+        self._items.append(item)
+        self._paths.append(link_ids)
+
+    def to_streams(self) -> list:
+        links = self._topo.links
+        streams = []
+        for pos, (item, link_ids) in enumerate(zip(self._items, self._paths)):
+            alternatives = [[links[i] for i in p] for p in self._alternatives.get(pos, ())]
+            stream = Stream(item["label"], [links[i] for i in link_ids], item["priority"], item["rate"], item["burst"], item["minFrameSize"], item["maxFrameSize"], alternatives)
+            stream._id = item["id"]
+            streams.append(stream)
+        if len(streams) > 0:
+            Stream.LAST_ID = max(Stream.LAST_ID, max(st.id for st in streams))
+        return streams
+
+    def to_table(self) -> StreamTable:
+        items = self._items
+        path_offsets = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in self._paths], out=path_offsets[1:])
+        alt_offsets = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum([len(self._alternatives.get(pos, ())) for pos in range(len(items))], out=alt_offsets[1:])
+        alternatives = [p for pos in sorted(self._alternatives) for p in self._alternatives[pos]]
+        alt_path_offsets = np.zeros(len(alternatives) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in alternatives], out=alt_path_offsets[1:])
+        table = StreamTable(self._topo.links,
+                            labels=[it["label"] for it in items],
+                            path_offsets=path_offsets,
+                            path_links=np.fromiter((i for p in self._paths for i in p), dtype=np.int32, count=int(path_offsets[-1])),
+                            priority=[it["priority"] for it in items],
+                            rate=[it["rate"] for it in items],
+                            burst=[it["burst"] for it in items],
+                            minFrameSize=[it["minFrameSize"] for it in items],
+                            maxFrameSize=[it["maxFrameSize"] for it in items],
+                            ids=[it["id"] for it in items],
+                            alt_offsets=alt_offsets,
+                            alt_path_offsets=alt_path_offsets,
+                            alt_path_links=np.fromiter((i for p in alternatives for i in p), dtype=np.int32, count=int(alt_path_offsets[-1])))
+        if len(table) > 0:
+            Stream.LAST_ID = max(Stream.LAST_ID, int(table.ids.max()))
+        return table
+
+
+def iter_json_sections(file: TextIO, chunk_size: int = 2**20) -> Iterator[Tuple[str, object]]:
+    """
+    Incrementally parses a JSON object of arrays ({"key": [item, ...], ...}) and yields (key, item) pairs,
+    holding at most one chunk plus one item in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = file.read(chunk_size)
+        eof = len(chunk) == 0
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return not eof
+
+    def next_char() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                raise ValueError("unexpected end of JSON file")
+
+    def expect(chars: str) -> str:
+        nonlocal pos
+        c = next_char()
+        if c not in chars:
+            raise ValueError(f"expected one of {chars!r} in JSON file, found {c!r}")
+        pos += 1
+        return c
+
+    def decode():
+        nonlocal pos
+        next_char()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # a value ending at the buffer end might be truncated (e.g. a number)
+                if end < len(buffer) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+
+    expect("{")
+    if next_char() == "}":
+        return
+    while True:
+        key = decode()
+        expect(":")
+        expect("[")
+        if next_char() == "]":
+            pos += 1
+        else:
+            while True:
+                yield key, decode()
+                if expect(",]") == "]":
+                    break
+        if expect(",}") == "}":
+            return
+
+
+def open_compressed(path: str, mode: str, compression: Literal["gzip", "zstd"] = None) -> BinaryIO:
+    if compression == None:
+        if str(path).endswith(".gz"):
+            compression = "gzip"
+        elif str(path).endswith(".zst"):
+            compression = "zstd"
+
+    if compression == None:
+        return open(path, mode)
+    if compression == "gzip":
+        return gzip.open(path, mode, compresslevel=6)
+    if compression == "zstd":
+        if zstandard == None:
+            raise ValueError("zstd compression requires the `zstandard` package")
+        if "r" in mode:
+            return zstandard.open(path, mode)
+        return zstandard.open(path, mode, cctx=zstandard.ZstdCompressor(level=3))
+    raise ValueError(f"compression may only be 'gzip' or 'zstd', not '{compression}'")
+
+
+def write_json_sections(file: BinaryIO, sections: Iterable, indent: int = 4, encoder: Literal["json", "orjson"] = None, buffer_items: int = 1000):
+    """
+    Writes {"key": [items...], ...} for (key, item generator) sections, formatted exactly like json.dump(..., indent=indent).
+    """
+    encode = _item_encoder(indent, encoder)
+
+    if indent == None:
+        newline, indent1, indent2, key_separator = "", "", "", ":"
+    else:
+        newline, indent1, indent2, key_separator = "\n", " " * indent, " " * (2 * indent), ": "
+    item_prefix = newline + indent2
+
+    buffer = ["{" + newline]
+    sections = list(sections)
+    for i, (key, items) in enumerate(sections):
+        buffer.append(f"{indent1}{json.dumps(key)}{key_separator}[")
+        separator = ""
+        for item in items:
+            buffer.append(separator + item_prefix + encode(item).replace("\n", item_prefix))
+            separator = ","
+            if len(buffer) >= buffer_items:
+                file.write("".join(buffer).encode())
+                buffer.clear()
+        if separator:
+            buffer.append(newline + indent1)
+        buffer.append("]" + ("," if i < len(sections) - 1 else "") + newline)
+    buffer.append("}")
+    file.write("".join(buffer).encode())
+
+
+def _item_encoder(indent: int, encoder: Literal["json", "orjson"] = None) -> Callable[[object], str]:
+    if encoder == None:
+        encoder = "orjson" if orjson != None and indent in (None, 2) else "json"
+
+    if encoder == "orjson":
+        if orjson == None:
+            raise ValueError("encoder 'orjson' requires the `orjson` package")
+        if indent not in (None, 2):
+            raise ValueError("orjson only supports compact output or indent=2")
+        option = orjson.OPT_INDENT_2 if indent == 2 else 0
+        return lambda o: orjson.dumps(o, option=option).decode()
+
+    if encoder == "json":
+        if indent == None:
+            json_encoder = MyEncoder(separators=(",", ":"))
+        else:
+            json_encoder = MyEncoder(indent=indent)
+        return json_encoder.encode
+    raise ValueError(f"encoder may only be 'json' or 'orjson', not '{encoder}'")
 
 
 class MyEncoder(JSONEncoder):
@@ -0,0 +1,218 @@
+"""
+Binary scenario format: a directory of .npy arrays holding the same data as Topology.to_json_dict().
+
+    nodes.npy         structured (name, type)          type is an index into Node.VALID_TYPES
+    links.npy         structured (n1, n2, bandwidth)   n1/n2 are row numbers in nodes.npy
+    streams.npy       structured (id, priority, rate, burst, minFrameSize, maxFrameSize)
+    stream_labels.npy labels of the streams
+    path_offsets.npy  the path of stream r is path_nodes[path_offsets[r]:path_offsets[r+1]]
+    path_nodes.npy    row numbers in nodes.npy
+    alt_offsets.npy       the alternative paths of stream r are a in alt_offsets[r]:alt_offsets[r+1]
+    alt_path_offsets.npy  the nodes of alternative path a are alt_path_nodes[alt_path_offsets[a]:alt_path_offsets[a+1]]
+    alt_path_nodes.npy    row numbers in nodes.npy
+
+All arrays can be memory-mapped, so opening a scenario is instant and only the accessed streams are read.
+"""
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+
+from import_export.json import from_json_items
+from lib.stream import Stream
+from lib.stream_table import StreamTable
+from lib.topology import Topology, Node
+
+LINK_DTYPE = np.dtype([("n1", np.int32), ("n2", np.int32), ("bandwidth", np.float64)])
+STREAM_DTYPE = np.dtype([("id", np.int64), ("priority", np.int8), ("rate", np.float64), ("burst", np.int64), ("minFrameSize", np.int64), ("maxFrameSize", np.int64)])
+
+
+def to_npy(topo: Topology, directory: str):
+    data = topo.to_json_dict()
+    nodes = [n.to_json_dict() for n in data["nodes"]]
+    links = [l.to_json_dict() for l in data["links"]]
+    streams = list(topo.stream_json_dicts_sorted())
+
+    node_ids = {n["name"]: i for i, n in enumerate(nodes)}
+    type_ids = {t: i for i, t in enumerate(Node.VALID_TYPES)}
+
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+
+    node_array = np.empty(len(nodes), dtype=[("name", f"U{max([1] + [len(n['name']) for n in nodes])}"), ("type", np.uint8)])
+    node_array["name"] = [n["name"] for n in nodes]
+    node_array["type"] = [type_ids[n["type"]] for n in nodes]
+    np.save(path / "nodes.npy", node_array)
+
+    link_array = np.empty(len(links), dtype=LINK_DTYPE)
+    link_array["n1"] = [node_ids[l["n1"]] for l in links]
+    link_array["n2"] = [node_ids[l["n2"]] for l in links]
+    link_array["bandwidth"] = [l["bandwidth"] for l in links]
+    np.save(path / "links.npy", link_array)
+
+    stream_array = np.empty(len(streams), dtype=STREAM_DTYPE)
+    for field in STREAM_DTYPE.names:
+        stream_array[field] = [st[field] for st in streams]
+    np.save(path / "streams.npy", stream_array)
+    np.save(path / "stream_labels.npy", np.array([st["label"] for st in streams], dtype=f"U{max([1] + [len(st['label']) for st in streams])}"))
+
+    path_offsets = np.zeros(len(streams) + 1, dtype=np.int64)
+    np.cumsum([len(st["path"]) for st in streams], out=path_offsets[1:])
+    np.save(path / "path_offsets.npy", path_offsets)
+    np.save(path / "path_nodes.npy", np.fromiter((node_ids[name] for st in streams for name in st["path"]), dtype=np.int32, count=int(path_offsets[-1])))
+
+    alternatives = [p for st in streams for p in st.get("alternativePaths", ())]
+    alt_offsets = np.zeros(len(streams) + 1, dtype=np.int64)
+    np.cumsum([len(st.get("alternativePaths", ())) for st in streams], out=alt_offsets[1:])
+    np.save(path / "alt_offsets.npy", alt_offsets)
+    alt_path_offsets = np.zeros(len(alternatives) + 1, dtype=np.int64)
+    np.cumsum([len(p) for p in alternatives], out=alt_path_offsets[1:])
+    np.save(path / "alt_path_offsets.npy", alt_path_offsets)
+    np.save(path / "alt_path_nodes.npy", np.fromiter((node_ids[name] for p in alternatives for name in p), dtype=np.int32, count=int(alt_path_offsets[-1])))
+
+
+class NpyScenario(object):
+    """
+    Memory-mapped view of a scenario written by to_npy(); nothing is read before it is accessed.
+    """
+
+    def __init__(self, directory: str) -> None:
+        path = Path(directory)
+        self.nodes = np.load(path / "nodes.npy", mmap_mode="r")
+        self.links = np.load(path / "links.npy", mmap_mode="r")
+        self.streams = np.load(path / "streams.npy", mmap_mode="r")
+        self.stream_labels = np.load(path / "stream_labels.npy", mmap_mode="r")
+        self.path_offsets = np.load(path / "path_offsets.npy", mmap_mode="r")
+        self.path_nodes = np.load(path / "path_nodes.npy", mmap_mode="r")
+        self.alt_offsets = np.load(path / "alt_offsets.npy", mmap_mode="r")
+        self.alt_path_offsets = np.load(path / "alt_path_offsets.npy", mmap_mode="r")
+        self.alt_path_nodes = np.load(path / "alt_path_nodes.npy", mmap_mode="r")
+
+    @property
+    def num_streams(self) -> int:
+        return len(self.streams)
+
+    def stream_json_dict(self, row: int) -> dict:
+        """
+        returns stream `row` in the format of Stream.to_json_dict()
+        """
+        st = self.streams[row]
+        names = self.nodes["name"]
+        d = {
+            "id": int(st["id"]),
+            "label": str(self.stream_labels[row]),
+            "path": [str(name) for name in names[self.path_nodes[self.path_offsets[row]:self.path_offsets[row + 1]]]],
+            "priority": int(st["priority"]),
+            "rate": float(st["rate"]),
+            "burst": int(st["burst"]),
+            "minFrameSize": int(st["minFrameSize"]),
+            "maxFrameSize": int(st["maxFrameSize"])
+        }
+        alternatives = range(self.alt_offsets[row], self.alt_offsets[row + 1])
+        if len(alternatives) > 0:
+            d["alternativePaths"] = [[str(name) for name in names[self.alt_path_nodes[self.alt_path_offsets[a]:self.alt_path_offsets[a + 1]]]] for a in alternatives]
+        return d
+
+    def to_json_dict(self) -> dict:
+        """
+        Same content as Topology.to_json_dict() of the saved topology, with all entries as plain dicts
+        """
+        return {
+            "nodes": list(self._node_items()),
+            "links": list(self._link_items()),
+            "streams": [self.stream_json_dict(r) for r in range(self.num_streams)]
+        }
+
+    def _node_items(self) -> Iterator[Dict]:
+        for name, type in zip(self.nodes["name"].tolist(), self.nodes["type"].tolist()):
+            yield {"name": name, "type": Node.VALID_TYPES[type]}
+
+    def _link_items(self) -> Iterator[Dict]:
+        names = self.nodes["name"].tolist()
+        for n1, n2, bandwidth in zip(self.links["n1"].tolist(), self.links["n2"].tolist(), self.links["bandwidth"].tolist()):
+            yield {"n1": names[n1], "n2": names[n2], "bandwidth": bandwidth}
+
+    def to_topology(self, rows: np.ndarray = None, as_table: bool = False) -> Topology:
+        """
+        Builds the topology with all streams, or only those in `rows`.
+
+        :param as_table: load the streams into a StreamTable instead of Stream objects
+        """
+        topo = from_json_items([("nodes", item) for item in self._node_items()] + [("links", item) for item in self._link_items()])
+
+        if rows is None:
+            rows = np.arange(self.num_streams)
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return topo
+
+        # nodes were added in file order, so file rows are node indexes
+        path_offsets, path_nodes = _gather(self.path_offsets, self.path_nodes, rows)
+        link_offsets, link_ids = _node_paths_to_links(topo, path_offsets, path_nodes)
+
+        # the alternatives of the selected streams, and their paths
+        alt_offsets, alternatives = _gather(self.alt_offsets, np.arange(len(self.alt_path_offsets) - 1), rows)
+        alt_path_offsets, alt_path_nodes = _gather(self.alt_path_offsets, self.alt_path_nodes, alternatives)
+        alt_link_offsets, alt_link_ids = _node_paths_to_links(topo, alt_path_offsets, alt_path_nodes)
+
+        st = self.streams[rows]
+        table = StreamTable(topo.links,
+                            labels=self.stream_labels[rows].tolist(),
+                            path_offsets=link_offsets,
+                            path_links=link_ids,
+                            priority=st["priority"],
+                            rate=st["rate"],
+                            burst=st["burst"],
+                            minFrameSize=st["minFrameSize"],
+                            maxFrameSize=st["maxFrameSize"],
+                            ids=st["id"],
+                            alt_offsets=alt_offsets,
+                            alt_path_offsets=alt_link_offsets,
+                            alt_path_links=alt_link_ids)
+        Stream.LAST_ID = max(Stream.LAST_ID, int(table.ids.max()))
+
+        if as_table:
+            topo.add_streams(table)
+        else:
+            topo.add_streams(table.to_streams())
+        return topo
+
+
+def _gather(offsets: np.ndarray, items: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    returns (offsets, items) of the ragged rows `rows` of items, i.e. items[offsets[r]:offsets[r+1]] for r in rows
+    """
+    offsets = np.asarray(offsets)
+    lengths = offsets[rows + 1] - offsets[rows]
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    positions = np.repeat(offsets[rows] - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    return new_offsets, np.asarray(items)[positions]
+
+
+def _node_paths_to_links(topo: Topology, path_offsets: np.ndarray, path_nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    returns (offsets, link ids) of ragged node paths, given as node indexes
+    """
+    num_paths = len(path_offsets) - 1
+    if num_paths == 0:
+        return path_offsets, np.zeros(0, dtype=np.int32)
+
+    # map consecutive node pairs to link ids
+    num_nodes = len(topo.nodes)
+    core = topo.core
+    link_keys = core.src.astype(np.int64) * num_nodes + core.dst
+    link_order = np.argsort(link_keys)
+    not_last = np.ones(len(path_nodes), dtype=bool)
+    not_last[path_offsets[1:] - 1] = False
+    hop_keys = path_nodes[:-1][not_last[:-1]].astype(np.int64) * num_nodes + path_nodes[1:][not_last[:-1]]
+    found = np.searchsorted(link_keys, hop_keys, sorter=link_order)
+    found = np.minimum(found, len(link_keys) - 1)
+    link_ids = link_order[found]
+    if np.any(link_keys[link_ids] != hop_keys):
+        raise ValueError("a stream path uses a link that does not exist")
+    return path_offsets - np.arange(num_paths + 1), link_ids
+
+
+def from_npy(directory: str, rows: np.ndarray = None, as_table: bool = False) -> Topology:
+    return NpyScenario(directory).to_topology(rows, as_table)
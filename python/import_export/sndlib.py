@@ -1,12 +1,103 @@
-from lib.topology import Topology
+import re
+from typing import Iterable, List
 
+from lib.stream import Stream, PREAMBLE, IPG
+from lib.topology import Topology, Node
 
-def from_sndlib(sndlib_native_format: str) -> Topology:
+# <node_id> ( <longitude> <latitude> )
+NODE_LINE = re.compile(r"(\S+)\s*\(")
+# <link_id> ( <source> <target> ) <pre_installed_capacity> <pre_installed_capacity_cost> <routing_cost> <setup_cost> ( {<module_capacity> <module_cost>}* )
+LINK_LINE = re.compile(r"(\S+)\s*\(\s*(\S+)\s+(\S+)\s*\)\s*(\S+)\s+\S+\s+\S+\s+\S+\s*\(([^)]*)\)")
+# <demand_id> ( <source> <target> ) <routing_unit> <demand_value> <max_path_length>
+DEMAND_LINE = re.compile(r"(\S+)\s*\(\s*(\S+)\s+(\S+)\s*\)\s*\S+\s+(\S+)")
+
+
+def from_sndlib(sndlib_native_format: str, capacity_unit: float = 1e6, default_bandwidth: float = 1e9, join_points: bool = True, demands_as_streams: bool = False, demand_unit: float = 1e6, priority: int = 0, maxFrameSize: int = 1500*8) -> Topology:
+    """
+    :param sndlib_native_format: the SNDlib network in native format, see from_sndlib_file() for files
+    """
+    return from_sndlib_lines(sndlib_native_format.split("\n"), capacity_unit, default_bandwidth, join_points, demands_as_streams, demand_unit, priority, maxFrameSize)
+
+
+def from_sndlib_file(path: str, **kwargs) -> Topology:
+    with open(path, "r") as file:
+        return from_sndlib_lines(file, **kwargs)
+
+
+def from_sndlib_lines(lines: Iterable[str], capacity_unit: float = 1e6, default_bandwidth: float = 1e9, join_points: bool = True, demands_as_streams: bool = False, demand_unit: float = 1e6, priority: int = 0, maxFrameSize: int = 1500*8) -> Topology:
+    """
+    Parses the NODES, LINKS and DEMANDS sections of an SNDlib network (native format) in a single pass.
+
+    All nodes become switches ('-' in names is replaced by '_'), every link becomes a pair of links.
+    The bandwidth of a link is its pre-installed capacity, or its largest module capacity if nothing is pre-installed,
+    times `capacity_unit`; links without any capacity get `default_bandwidth`. Parallel links are merged (the first one is kept).
+
+    :param capacity_unit: Bit/s per capacity unit of the instance (SNDlib capacities are usually given in MBit/s)
+    :param join_points: mark all nodes as join points, e.g. to use the network as backbone in combine_topologies()
+    :param demands_as_streams: add a stream along the shortest path for every demand, with rate = demand value * `demand_unit`
+    :param priority: priority of the demand streams
+    :param maxFrameSize: max frame size of the demand streams, in bit; their burst is one max sized frame
+    """
     topo = Topology()
+    links = []
+    demands = []
+    section = None
+    depth = 0
+
+    def name(id: str) -> str:
+        return id.replace("-", "_")
+
+    for line in lines:
+        line = line.strip()
+        if len(line) == 0 or line.startswith("#") or line.startswith("?"):
+            continue
+
+        if section is None:
+            if line.endswith("("):
+                section = line[:-1].strip()
+                depth = 1
+            continue
+        # entries of other sections (e.g. ADMISSIBLE_PATHS) may span several lines
+        depth += line.count("(") - line.count(")")
+        if depth <= 0:
+            section = None
+            continue
+
+        if section == "NODES":
+            m = NODE_LINE.match(line)
+            if m == None:
+                raise ValueError(f"Invalid node line: {line}")
+            topo.add_node(Node(name(m.group(1)), "switch", joinPoint=join_points))
+        elif section == "LINKS":
+            m = LINK_LINE.match(line)
+            if m == None:
+                raise ValueError(f"Invalid link line: {line}")
+            capacity = float(m.group(4))
+            if capacity <= 0:
+                capacity = max([float(c) for c in m.group(5).split()[0::2]], default=0.0)
+            links.append((name(m.group(2)), name(m.group(3)), capacity * capacity_unit if capacity > 0 else default_bandwidth))
+        elif section == "DEMANDS" and demands_as_streams:
+            m = DEMAND_LINE.match(line)
+            if m == None:
+                raise ValueError(f"Invalid demand line: {line}")
+            demands.append((m.group(1), name(m.group(2)), name(m.group(3)), float(m.group(4)) * demand_unit))
 
-    for l in sndlib_native_format.split("\n"):
-        pass
+    # links may reference nodes listed later, so they are added once all nodes are known
+    for n1, n2, bandwidth in links:
+        topo.get_node_by_name(n1).addNeigh(topo.get_node_by_name(n2), bandwidth)
 
-    # TODO
+    streams: List[Stream] = []
+    for label, n1, n2, rate in demands:
+        if n1 == n2 or rate <= 0:
+            continue
+        streams.append(Stream(label=label,
+                              path=topo.shortest_path(topo.get_node_by_name(n1), topo.get_node_by_name(n2)),
+                              priority=priority,
+                              rate=rate,
+                              burst=maxFrameSize + PREAMBLE + IPG,
+                              minFrameSize=64*8,
+                              maxFrameSize=maxFrameSize))
+    if len(streams) > 0:
+        topo.add_streams(streams)
 
-    return topo
\ No newline at end of file
+    return topo
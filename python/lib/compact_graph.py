@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from lib.instrumentation import count
+
+if TYPE_CHECKING:
+    from lib.topology import Topology
+
+# upper bound for the cached BFS trees, in nodes over all trees (about 16 byte each)
+TREE_CACHE_NODES = 2**23
+
+
+class CompactGraph(object):
+    """
+    Integer snapshot of a Topology.
+
+    Nodes and links are identified by their index in the topology (Node.index, Link.index).
+    The adjacency is stored in CSR form: the outgoing links of node i are
+    link_ids[offsets[i]:offsets[i+1]] (in the order of node.neighs), leading to targets[offsets[i]:offsets[i+1]].
+
+    Do not construct this directly, use Topology.core instead; the topology drops its snapshot on every mutation.
+    """
+
+    def __init__(self, topo: Topology) -> None:
+        nodes = topo.nodes
+        links = topo._links
+
+        self.num_nodes: int = len(nodes)
+        self.num_links: int = len(links)
+
+        # per-link arrays, indexed by Link.index
+        self.src = np.fromiter((l.n1.index for l in links), dtype=np.int32, count=self.num_links)
+        self.dst = np.fromiter((l.n2.index for l in links), dtype=np.int32, count=self.num_links)
+        self.bandwidths = np.fromiter((l.bandwidth for l in links), dtype=np.float64, count=self.num_links)
+        self.egress_ports = np.fromiter((l.egressPortN1 for l in links), dtype=np.int32, count=self.num_links)
+        self.ingress_ports = np.fromiter((l.ingressPortN2 for l in links), dtype=np.int32, count=self.num_links)
+
+        # per-node CSR arrays, indexed by Node.index
+        neigh_ids = [[l.index for l in n.neighs if l.index >= 0] for n in nodes]
+        degrees = np.fromiter((len(ids) for ids in neigh_ids), dtype=np.int64, count=self.num_nodes)
+        self.offsets = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(degrees, out=self.offsets[1:])
+        self.link_ids = np.fromiter((i for ids in neigh_ids for i in ids), dtype=np.int32, count=int(self.offsets[-1]))
+        self.targets = self.dst[self.link_ids]
+
+        # BFS trees per source node, filled lazily by source_tree()
+        self._trees: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+        self.derived: Dict[str, object] = {}
+        """
+        Indexes computed from this snapshot by other modules; dropped together with the snapshot.
+        """
+
+    def bfs(self, source: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Level-synchronous breadth first search over the CSR arrays.
+
+        Visits nodes in exactly the same order as a FIFO queue based BFS that iterates node.neighs in order,
+        hence the resulting shortest path tree is the same.
+
+        returns (dist, parent_link, order); dist is -1 and parent_link is -1 for unreached nodes,
+        order lists the reached nodes in discovery order (starting with source)
+        """
+        count("bfs")
+        dist = np.full(self.num_nodes, -1, dtype=np.int32)
+        parent_link = np.full(self.num_nodes, -1, dtype=np.int32)
+        dist[source] = 0
+
+        frontier = np.array([source], dtype=np.int64)
+        levels = [frontier]
+        d = 0
+
+        while frontier.size > 0:
+            # all outgoing edges of the frontier, in frontier order and neighbor order
+            starts = self.offsets[frontier]
+            counts = self.offsets[frontier + 1] - starts
+            total = int(counts.sum())
+            if total == 0:
+                break
+            edge_idx = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+
+            neigh = self.targets[edge_idx]
+            unseen = dist[neigh] < 0
+            neigh = neigh[unseen]
+            edge_idx = edge_idx[unseen]
+
+            # the first edge reaching a node wins, new nodes are ordered by their first appearance
+            _, first = np.unique(neigh, return_index=True)
+            first.sort()
+
+            d += 1
+            frontier = neigh[first].astype(np.int64)
+            dist[frontier] = d
+            parent_link[frontier] = self.link_ids[edge_idx[first]]
+            levels.append(frontier)
+
+        return dist, parent_link, np.concatenate(levels)
+
+    def source_tree(self, source: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Cached full BFS from source, see bfs().
+
+        The rows of all queried sources together form the hop distance matrix and the predecessor (last hop) table,
+        so repeated path and distance queries on the same snapshot are table lookups.
+        At most TREE_CACHE_NODES / num_nodes trees are kept, the oldest ones are dropped first.
+        """
+        tree = self._trees.get(source)
+        if tree is None:
+            tree = self.bfs(source)
+            if len(self._trees) >= max(1, TREE_CACHE_NODES // max(1, self.num_nodes)):
+                del self._trees[next(iter(self._trees))]
+            self._trees[source] = tree
+        return tree
+
+    def distances(self, sources: np.ndarray, targets: np.ndarray = None) -> np.ndarray:
+        """
+        returns the hop distance matrix (len(sources) x len(targets)), -1 for unreachable pairs
+        """
+        if targets is None:
+            targets = np.arange(self.num_nodes)
+        matrix = np.empty((len(sources), len(targets)), dtype=np.int32)
+        for i, source in enumerate(sources):
+            matrix[i] = self.source_tree(int(source))[0][targets]
+        return matrix
+
+    def path_link_ids(self, source: int, target: int) -> Optional[List[int]]:
+        """
+        returns the link ids of a shortest (hop count) path from source to target, or None if target is unreachable
+        """
+        if source == target:
+            return []
+
+        dist, parent_link, _ = self.source_tree(source)
+        if dist[target] < 0:
+            return None
+
+        return self.trace_path(parent_link, target)
+
+    def trace_path(self, parent_link: np.ndarray, target: int) -> List[int]:
+        path = []
+        link = int(parent_link[target])
+        while link >= 0:
+            path.append(link)
+            link = int(parent_link[self.src[link]])
+        path.reverse()
+        return path
+
+    def nodes_within_distance(self, source: int, min_dist: int, max_dist: int) -> np.ndarray:
+        """
+        returns the ids of all nodes (except source) with min_dist <= hop distance <= max_dist, in BFS discovery order
+        """
+        dist, _, order = self.source_tree(source)
+        d = dist[order]
+        return order[(d >= max(min_dist, 1)) & (d <= max_dist)]
@@ -0,0 +1,80 @@
+"""
+Canonical structural fingerprints of topologies, to detect structurally identical scenarios.
+
+The fingerprint is a Weisfeiler-Lehman hash: every node starts with a label for its type, and in every iteration
+takes the multiset of (link bandwidth, neighbor label) of its outgoing links into its label. The fingerprint hashes
+the multiset of all node labels (of all iterations), so it does not depend on node names, node order or link order.
+Isomorphic topologies always get the same fingerprint; different topologies that WL cannot tell apart (rare for
+the generated scenarios) get the same one, too.
+"""
+import hashlib
+
+import numpy as np
+
+from lib.instrumentation import timed
+from lib.topology import Topology, Node
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """
+    splitmix64 finalizer, elementwise on uint64 (wraps around)
+    """
+    x = np.asarray(x, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def _combine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        return _mix(_mix(a) + np.uint64(0x9e3779b97f4a7c15) * b)
+
+
+def node_labels(topo: Topology, iterations: int = 3) -> np.ndarray:
+    """
+    returns the WL labels (iterations + 1 rows, one column per node); row 0 is the node type
+    """
+    core = topo.core
+    type_ids = {t: i for i, t in enumerate(Node.VALID_TYPES)}
+    labels = np.empty((iterations + 1, core.num_nodes), dtype=np.uint64)
+    labels[0] = _mix(np.fromiter((type_ids[n.type] + 1 for n in topo.nodes), dtype=np.uint64, count=core.num_nodes))
+
+    # the bandwidth is part of every neighbor term, by its bit pattern
+    bandwidths = _mix(core.bandwidths.view(np.uint64))
+    for i in range(iterations):
+        neighbor_terms = _combine(labels[i][core.dst], bandwidths)
+        # multiset of the terms: sum of their hashes
+        aggregated = np.zeros(core.num_nodes, dtype=np.uint64)
+        np.add.at(aggregated, core.src, _mix(neighbor_terms))
+        labels[i + 1] = _combine(labels[i], aggregated)
+
+    return labels
+
+
+@timed()
+def topology_fingerprint(topo: Topology, iterations: int = 3, include_streams: bool = False) -> str:
+    """
+    Structural fingerprint (hex) of the topology, see module documentation.
+
+    :param iterations: WL iterations; a node label covers its neighborhood up to this many hops
+    :param include_streams: also hash the multiset of streams (parameters, labels of their end nodes and path length),
+                            so topologies with the same structure but different streams differ
+    """
+    labels = node_labels(topo, iterations)
+    h = hashlib.sha256()
+    h.update(np.array([topo.core.num_nodes, topo.core.num_links, iterations], dtype=np.int64).tobytes())
+    for row in labels:
+        h.update(np.sort(row).tobytes())
+
+    if include_streams:
+        streams = topo.get_all_streams()
+        final = labels[-1]
+        rows = np.array([(final[st.path[0].n1.index], final[st.path[-1].n2.index], len(st.path), st.priority,
+                          np.float64(st.rate).view(np.uint64), st.burst, st.minFrameSize, st.maxFrameSize) for st in streams],
+                        dtype=np.uint64).reshape(-1, 8)
+        rows = rows[np.lexsort(rows.T[::-1])]
+        h.update(b"streams")
+        h.update(rows.tobytes())
+
+    return h.hexdigest()
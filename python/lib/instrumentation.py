@@ -0,0 +1,158 @@
+"""
+Phase timers and counters for the factories.
+
+Nothing is recorded unless a report is being collected:
+
+    with collect() as report:
+        topo = industrial_scenario("big")
+    print(report.to_json_dict())
+
+Phases nest, a phase opened inside another one is recorded as "outer/inner". Counters are recorded under the
+innermost open phase, e.g. "industrial_scenario/create_streams/bfs".
+While no report is collected, phase() returns a shared no-op context manager and count() returns immediately.
+"""
+import functools
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+
+class Report(object):
+    def __init__(self) -> None:
+        self.times: Dict[str, float] = {}
+        """
+        total seconds per phase
+        """
+        self.calls: Dict[str, int] = {}
+        """
+        number of times each phase was entered
+        """
+        self.counters: Dict[str, int] = {}
+        self._stack: List[str] = []
+
+    def merge(self, other: "Report") -> "Report":
+        """
+        Adds the times, calls and counters of other to this report, e.g. to sum up the reports of a parallel batch
+        """
+        for mine, theirs in ((self.times, other.times), (self.calls, other.calls), (self.counters, other.counters)):
+            for key, value in theirs.items():
+                mine[key] = mine.get(key, 0) + value
+        return self
+
+    def to_json_dict(self) -> dict:
+        return {
+            "times": dict(sorted(self.times.items())),
+            "calls": dict(sorted(self.calls.items())),
+            "counters": dict(sorted(self.counters.items()))
+        }
+
+    @staticmethod
+    def from_json_dict(data: dict) -> "Report":
+        report = Report()
+        report.times = dict(data.get("times", {}))
+        report.calls = dict(data.get("calls", {}))
+        report.counters = dict(data.get("counters", {}))
+        return report
+
+    def __str__(self) -> str:
+        lines = [f"{name:<60} {self.calls[name]:>8}x {t:>10.4f}s" for name, t in sorted(self.times.items())]
+        lines += [f"{name:<60} {value:>9}" for name, value in sorted(self.counters.items())]
+        return "\n".join(lines)
+
+
+_report: Optional[Report] = None
+
+
+class _Phase(object):
+    __slots__ = ("report", "name", "start")
+
+    def __init__(self, report: Report, name: str) -> None:
+        self.report = report
+        self.name = name
+
+    def __enter__(self):
+        stack = self.report._stack
+        if stack:
+            self.name = f"{stack[-1]}/{self.name}"
+        stack.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        report = self.report
+        report._stack.pop()
+        report.times[self.name] = report.times.get(self.name, 0.0) + elapsed
+        report.calls[self.name] = report.calls.get(self.name, 0) + 1
+        return False
+
+
+class _NoPhase(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+def enabled() -> bool:
+    return _report is not None
+
+
+def phase(name: str):
+    """
+    Context manager timing the enclosed block as phase `name`
+    """
+    if _report is None:
+        return _NO_PHASE
+    return _Phase(_report, name)
+
+
+def timed(name: str = None):
+    """
+    Decorator recording every call of the function as a phase (named after the function by default)
+    """
+    def decorator(func):
+        phase_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _report is None:
+                return func(*args, **kwargs)
+            with _Phase(_report, phase_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, n: int = 1) -> None:
+    """
+    Adds n to counter `name` of the innermost open phase
+    """
+    report = _report
+    if report is None:
+        return
+    if report._stack:
+        name = f"{report._stack[-1]}/{name}"
+    report.counters[name] = report.counters.get(name, 0) + n
+
+
+@contextmanager
+def collect(report: Report = None) -> Iterator[Report]:
+    """
+    Records all phases and counters of the enclosed block into report (a new one if not given)
+    """
+    global _report
+    if report is None:
+        report = Report()
+    previous = _report
+    _report = report
+    try:
+        yield report
+    finally:
+        _report = previous
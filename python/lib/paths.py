@@ -0,0 +1,330 @@
+"""
+Path enumeration on the integer snapshot of a topology (see CompactGraph): k shortest loopless paths (Yen) and
+link or node disjoint paths of minimum total cost (Suurballe, as successive shortest paths in the residual graph).
+
+All functions work on node and link ids and return paths as lists of link ids.
+Costs are per link id and must be positive (inf: link not usable); without costs every hop counts 1.
+Use Topology.k_shortest_paths() and Topology.disjoint_paths() for memoized results as Link lists,
+and Topology.router() for cheapest paths under a cost model.
+"""
+from __future__ import annotations
+
+from heapq import heappush, heappop
+from math import inf
+from typing import Collection, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from lib.compact_graph import CompactGraph, TREE_CACHE_NODES
+from lib.instrumentation import count
+
+
+def adjacency(core: CompactGraph) -> List[List[Tuple[int, int]]]:
+    """
+    The CSR arrays as python lists, [node -> [(link, target), ...]]; built once per snapshot
+    """
+    adj = core.derived.get("paths/adjacency")
+    if adj is None:
+        link_ids = core.link_ids.tolist()
+        targets = core.targets.tolist()
+        offsets = core.offsets.tolist()
+        adj = [list(zip(link_ids[offsets[i]:offsets[i + 1]], targets[offsets[i]:offsets[i + 1]])) for i in range(core.num_nodes)]
+        core.derived["paths/adjacency"] = adj
+    return adj
+
+
+class CostRouter(object):
+    """
+    Cheapest paths on one snapshot under fixed link costs, see Topology.router().
+
+    Every queried source gets a full Dijkstra tree (binary heap over the adjacency lists), cached like
+    CompactGraph.source_tree(); so routing many streams from the same sources costs one tree per source.
+    Without costs, the BFS trees of the core are used, i.e. the paths of Topology.shortest_path().
+    """
+
+    def __init__(self, core: CompactGraph, costs: np.ndarray = None) -> None:
+        self.core = core
+        self.costs: Optional[List[float]] = None if costs is None else costs.tolist()
+        self._trees: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def source_tree(self, source: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        returns (dist, parent_link); dist is inf and parent_link is -1 for unreachable nodes
+        """
+        if self.costs is None:
+            dist, parent_link, _ = self.core.source_tree(source)
+            return np.where(dist >= 0, dist, inf), parent_link
+
+        tree = self._trees.get(source)
+        if tree is None:
+            tree = self._dijkstra(source)
+            if len(self._trees) >= max(1, TREE_CACHE_NODES // max(1, self.core.num_nodes)):
+                del self._trees[next(iter(self._trees))]
+            self._trees[source] = tree
+        return tree
+
+    def _dijkstra(self, source: int) -> Tuple[np.ndarray, np.ndarray]:
+        count("dijkstra")
+        adj = adjacency(self.core)
+        costs = self.costs
+        dist = [inf] * self.core.num_nodes
+        parent_link = [-1] * self.core.num_nodes
+        done = [False] * self.core.num_nodes
+        dist[source] = 0.0
+        heap = [(0.0, 0, source)]
+        pushed = 0
+
+        while heap:
+            d, _, u = heappop(heap)
+            if done[u]:
+                continue
+            done[u] = True
+            for link, v in adj[u]:
+                nd = d + costs[link]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    parent_link[v] = link
+                    pushed += 1
+                    heappush(heap, (nd, pushed, v))
+
+        return np.array(dist), np.array(parent_link, dtype=np.int32)
+
+    def path_link_ids(self, source: int, target: int) -> Optional[List[int]]:
+        """
+        returns the link ids of a cheapest path from source to target, or None if target is unreachable
+        """
+        if self.costs is None:
+            return self.core.path_link_ids(source, target)
+        if source == target:
+            return []
+
+        dist, parent_link = self.source_tree(source)
+        if dist[target] == inf:
+            return None
+        return self.core.trace_path(parent_link, target)
+
+
+def path_cost(path: Sequence[int], costs: Sequence[float] = None) -> float:
+    return len(path) if costs is None else sum(costs[l] for l in path)
+
+
+def dijkstra_path(core: CompactGraph, source: int, target: int, costs: Sequence[float] = None,
+                  banned_links: Collection[int] = (), banned_nodes: Collection[int] = ()) -> Optional[List[int]]:
+    """
+    Cheapest path from source to target that avoids the banned links and nodes (binary heap, stops at target).
+
+    Ties are broken by discovery order, so with unit costs the result has the fewest hops.
+
+    returns the link ids, or None if target is unreachable
+    """
+    if source == target:
+        return []
+
+    adj = adjacency(core)
+    dist = {source: 0.0}
+    parent_link = {}
+    done = set()
+    heap = [(0.0, 0, source)]
+    pushed = 0
+
+    while heap:
+        d, _, u = heappop(heap)
+        if u in done:
+            continue
+        if u == target:
+            break
+        done.add(u)
+        for link, v in adj[u]:
+            if v in done or link in banned_links or v in banned_nodes:
+                continue
+            nd = d + (1.0 if costs is None else costs[link])
+            if nd < dist.get(v, inf):
+                dist[v] = nd
+                parent_link[v] = link
+                pushed += 1
+                heappush(heap, (nd, pushed, v))
+
+    if target not in parent_link:
+        return None
+
+    src = core.src
+    path = []
+    node = target
+    while node != source:
+        link = parent_link[node]
+        path.append(link)
+        node = int(src[link])
+    path.reverse()
+    return path
+
+
+def k_shortest_paths(core: CompactGraph, source: int, target: int, k: int, costs: Sequence[float] = None) -> List[List[int]]:
+    """
+    Up to k loopless paths from source to target, cheapest first (Yen's algorithm).
+
+    Without costs, the first path is the BFS path of core.path_link_ids(), i.e. the one Topology.shortest_path() returns.
+    """
+    if k < 1:
+        return []
+    if source == target:
+        return [[]]
+
+    first = core.path_link_ids(source, target) if costs is None else dijkstra_path(core, source, target, costs)
+    if first is None:
+        return []
+
+    src = core.src
+    found = [first]
+    seen = {tuple(first)}
+    candidates = []  # heap of (cost, order, path)
+    order = 0
+
+    while len(found) < k:
+        previous = found[-1]
+        for i in range(len(previous)):
+            root = previous[:i]
+            spur_node = source if i == 0 else int(core.dst[root[-1]])
+            # do not leave the spur node like an already found path with the same root, and do not revisit the root
+            banned_links = {p[i] for p in found if len(p) > i and p[:i] == root}
+            banned_nodes = {int(src[l]) for l in root}
+            spur = dijkstra_path(core, spur_node, target, costs, banned_links, banned_nodes)
+            if spur is None:
+                continue
+            path = root + spur
+            if tuple(path) not in seen:
+                seen.add(tuple(path))
+                order += 1
+                heappush(candidates, (path_cost(path, costs), order, path))
+        if not candidates:
+            break
+        found.append(heappop(candidates)[2])
+
+    return found
+
+
+def disjoint_paths(core: CompactGraph, source: int, target: int, k: int = 2, node_disjoint: bool = False, costs: Sequence[float] = None) -> List[List[int]]:
+    """
+    Up to k paths from source to target that share no link (node_disjoint: no node besides source and target),
+    with minimum total cost, cheapest first.
+
+    Suurballe's algorithm generalized to k paths: k times, the cheapest augmenting path in the residual graph
+    (Dijkstra on reduced costs, the residual graph is not materialized) is added to the flow;
+    the final flow is decomposed into the paths.
+    As costs are positive, the paths never use both directions of a cable, so they are also physically disjoint.
+
+    Fewer than k paths are returned if no more disjoint paths exist, none if target is unreachable.
+    """
+    if k < 1:
+        return []
+    if source == target:
+        return [[]]
+
+    adj = adjacency(core)
+    src = core.src
+    dst = core.dst
+
+    def cost(link):
+        return 1.0 if costs is None else costs[link]
+
+    # links used by the paths so far, and by the node they end at
+    flow = set()
+    flow_in: Dict[int, List[int]] = {}
+    # node_disjoint: nodes (besides source and target) on a path
+    used = set()
+
+    # residual arcs as (move, head, cost); moves: (0, link) use link, (1, link) cancel link,
+    # (2, node) enter node (node_disjoint), (3, node) cancel entering node.
+    # node_disjoint splits every node v into 2v (in) and 2v + 1 (out).
+    if node_disjoint:
+        start, sink = 2 * source + 1, 2 * target
+
+        def arcs(x):
+            u = x >> 1
+            if x & 1:
+                for link, v in adj[u]:
+                    if link not in flow:
+                        yield (0, link), 2 * v, cost(link)
+                if u in used:
+                    yield (3, u), 2 * u, 0.0
+            else:
+                if u not in used:
+                    yield (2, u), 2 * u + 1, 0.0
+                for link in flow_in.get(u, ()):
+                    yield (1, link), 2 * int(src[link]) + 1, -cost(link)
+    else:
+        start, sink = source, target
+
+        def arcs(u):
+            for link, v in adj[u]:
+                if link not in flow:
+                    yield (0, link), v, cost(link)
+            for link in flow_in.get(u, ()):
+                yield (1, link), int(src[link]), -cost(link)
+
+    # node potentials (relative to the unsettled nodes) that keep the reduced costs of all residual arcs non-negative
+    potential: Dict[int, float] = {}
+
+    for _ in range(k):
+        dist = {start: 0.0}
+        parent = {}
+        done = set()
+        heap = [(0.0, 0, start)]
+        pushed = 0
+        while heap:
+            d, _, x = heappop(heap)
+            if x in done:
+                continue
+            done.add(x)
+            if x == sink:
+                break
+            px = potential.get(x, 0.0)
+            for move, y, c in arcs(x):
+                if y in done:
+                    continue
+                nd = d + max(0.0, c + px - potential.get(y, 0.0))
+                if nd < dist.get(y, inf):
+                    dist[y] = nd
+                    parent[y] = (x, move)
+                    pushed += 1
+                    heappush(heap, (nd, pushed, y))
+
+        if sink not in done:
+            break
+
+        # potentials of unsettled nodes grow by dist(sink), settled ones by their distance
+        d_sink = dist[sink]
+        for x in done:
+            potential[x] = potential.get(x, 0.0) + dist[x] - d_sink
+
+        y = sink
+        while y != start:
+            x, (kind, item) = parent[y]
+            if kind == 0:
+                flow.add(item)
+                flow_in.setdefault(int(dst[item]), []).append(item)
+            elif kind == 1:
+                flow.remove(item)
+                flow_in[int(dst[item])].remove(item)
+            elif kind == 2:
+                used.add(item)
+            else:
+                used.discard(item)
+            y = x
+
+    # decompose the flow; without cycles (costs are positive) every walk from source ends at target
+    flow_out: Dict[int, List[int]] = {}
+    for link in sorted(flow):
+        flow_out.setdefault(int(src[link]), []).append(link)
+
+    paths = []
+    while flow_out.get(source):
+        path = []
+        node = source
+        while node != target:
+            link = flow_out[node].pop()
+            path.append(link)
+            node = int(dst[link])
+        paths.append(path)
+
+    paths.sort(key=lambda p: (path_cost(p, costs), p))
+    return paths
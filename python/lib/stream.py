@@ -9,12 +9,14 @@ IPG = 12 * 8  # Bit
 class Stream(object):
     LAST_ID = -1
 
-    def __init__(self, label: str, path: List, priority: int, rate: float, burst: int, minFrameSize: int, maxFrameSize: int) -> None:
+    def __init__(self, label: str, path: List, priority: int, rate: float, burst: int, minFrameSize: int, maxFrameSize: int, alternativePaths: List[List] = None) -> None:
         """
         :param rate: in bits/s
         :param burst: in bit (including overheads PREAMBLE + IPG)
         :minFrameSize: in bit (excluding overhead)
         :maxFrameSize: in bit (excluding overhead)
+        :param alternativePaths: further candidate paths between the same end nodes (e.g. from Topology.k_shortest_paths()
+                                 or Topology.disjoint_paths()); they do not carry the stream, only path carries local streams
         """
         Stream.LAST_ID += 1
         self._id = Stream.LAST_ID
@@ -25,6 +27,7 @@ class Stream(object):
         self._burst = burst
         self._minFrameSize = minFrameSize
         self._maxFrameSize = maxFrameSize
+        self._alternativePaths = [] if alternativePaths == None else alternativePaths
         self.init_local_streams()
 
         if burst < maxFrameSize + PREAMBLE + IPG:
@@ -54,11 +57,14 @@ class Stream(object):
     @property
     def maxFrameSize(self): return self._maxFrameSize
 
+    @property
+    def alternativePaths(self): return self._alternativePaths
+
     def init_local_streams(self):
         self.localStreams = [LocalStream(self, i) for i in range(len(self.path))]
 
     def to_json_dict(self):
-        return {
+        d = {
             "id": self.id,
             "label": self.label,
             "path": [self.path[0].n1.name] + [l.n2.name for l in self.path],
@@ -68,9 +74,12 @@ class Stream(object):
             "minFrameSize": self.minFrameSize,
             "maxFrameSize": self.maxFrameSize
         }
+        if len(self.alternativePaths) > 0:
+            d["alternativePaths"] = [[p[0].n1.name] + [l.n2.name for l in p] for p in self.alternativePaths]
+        return d
 
     def clone(self):
-        return Stream(self._label, self._path, self._priority, self._rate, self._burst, self._minFrameSize, self._maxFrameSize)
+        return Stream(self._label, self._path, self._priority, self._rate, self._burst, self._minFrameSize, self._maxFrameSize, self._alternativePaths)
 
     def __key(self):
         return (self._id, self._priority, self._rate, self._burst, self._minFrameSize, self._maxFrameSize, self._path[-1])
@@ -0,0 +1,459 @@
+from __future__ import annotations
+
+import weakref
+from math import inf
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from lib.stream import Stream, LocalStream, PREAMBLE, IPG
+
+HOP_COLUMNS = ("accMaxLatency", "accMinLatency", "accMinLatencyCQF", "accMaxLatencyCQF", "maxIdleSlope")
+"""
+The per hop columns of a StreamTable, i.e. the LocalStream attributes without the leading underscore
+"""
+
+class StreamTable(object):
+    """
+    Struct-of-arrays representation of many streams.
+
+    Per stream (indexed by row): ids, labels, priority, rate, burst, minFrameSize, maxFrameSize.
+    Paths are stored ragged: the links of row r are links[path_links[path_offsets[r]:path_offsets[r+1]]],
+    with link ids being Link.index of the topology the streams belong to.
+    Per hop (indexed like path_links): accMaxLatency, accMinLatency, accMinLatencyCQF, accMaxLatencyCQF, maxIdleSlope.
+    Alternative paths (Stream.alternativePaths) are stored ragged twice: the alternatives of row r are a in
+    alt_offsets[r]:alt_offsets[r+1], the links of alternative a are links[alt_path_links[alt_path_offsets[a]:alt_path_offsets[a+1]]].
+
+    Stream/LocalStream compatible views are created on demand via table[row] or by iterating the table.
+    """
+
+    def __init__(self, links: Sequence, labels: List[str], path_offsets: np.ndarray, path_links: np.ndarray, priority: np.ndarray, rate: np.ndarray, burst: np.ndarray, minFrameSize: np.ndarray, maxFrameSize: np.ndarray, ids: np.ndarray = None, alt_offsets: np.ndarray = None, alt_path_offsets: np.ndarray = None, alt_path_links: np.ndarray = None) -> None:
+        """
+        :param links: all links of the topology, indexed by Link.index (usually Topology.links)
+        :param ids: stream ids; if None, a new block of ids is reserved like Stream() does
+        :param alt_offsets: alternative paths per row, see above; if None, no stream has alternative paths
+        """
+        num_streams = len(labels)
+
+        self.links = links
+        self.labels: List[str] = list(labels)
+        self.path_offsets = np.asarray(path_offsets, dtype=np.int64)
+        self.path_links = np.asarray(path_links, dtype=np.int32)
+        self.priority = np.asarray(priority, dtype=np.int8)
+        self.rate = np.asarray(rate, dtype=np.float64)
+        self.burst = np.asarray(burst, dtype=np.int64)
+        self.minFrameSize = np.asarray(minFrameSize, dtype=np.int64)
+        self.maxFrameSize = np.asarray(maxFrameSize, dtype=np.int64)
+
+        if ids is None:
+            ids = np.arange(Stream.LAST_ID + 1, Stream.LAST_ID + 1 + num_streams, dtype=np.int64)
+            Stream.LAST_ID += num_streams
+        self.ids = np.asarray(ids, dtype=np.int64)
+
+        if alt_offsets is None:
+            alt_offsets = np.zeros(num_streams + 1, dtype=np.int64)
+            alt_path_offsets = np.zeros(1, dtype=np.int64)
+            alt_path_links = np.zeros(0, dtype=np.int32)
+        self.alt_offsets = np.asarray(alt_offsets, dtype=np.int64)
+        self.alt_path_offsets = np.asarray(alt_path_offsets, dtype=np.int64)
+        self.alt_path_links = np.asarray(alt_path_links, dtype=np.int32)
+
+        for name in ("priority", "rate", "burst", "minFrameSize", "maxFrameSize", "ids"):
+            if len(getattr(self, name)) != num_streams:
+                raise ValueError(f"{name} has {len(getattr(self, name))} entries, expected {num_streams}")
+        if len(self.path_offsets) != num_streams + 1 or self.path_offsets[-1] != len(self.path_links):
+            raise ValueError("path_offsets do not match path_links")
+        if np.any(np.diff(self.path_offsets) < 1):
+            raise ValueError("every stream needs a path of at least one link")
+        if len(self.alt_offsets) != num_streams + 1 or self.alt_offsets[-1] != len(self.alt_path_offsets) - 1 or self.alt_path_offsets[-1] != len(self.alt_path_links):
+            raise ValueError("alt_offsets and alt_path_offsets do not match alt_path_links")
+
+        invalid = np.flatnonzero(self.burst < self.maxFrameSize + PREAMBLE + IPG)
+        if len(invalid) > 0:
+            r = invalid[0]
+            raise ValueError(f"burst={self.burst[r]} < maxFrameSize={self.maxFrameSize[r]} + Preamble+IPG ({PREAMBLE+IPG}) for stream {self.labels[r]}")
+
+        num_hops = len(self.path_links)
+        self.accMaxLatency = np.full(num_hops, inf)
+        self.accMinLatency = np.zeros(num_hops)
+        self.accMinLatencyCQF = np.zeros(num_hops)
+        self.accMaxLatencyCQF = np.zeros(num_hops)
+        self.maxIdleSlope = np.full(num_hops, -1.0)
+
+        self._views: weakref.WeakValueDictionary[int, TableStream] = weakref.WeakValueDictionary()
+        """
+        row -> its view, as long as the view is referenced elsewhere
+        """
+
+    @staticmethod
+    def from_streams(links: Sequence, streams: Iterable[Stream]) -> StreamTable:
+        """
+        Copies regular Stream objects (including their ids, alternative paths and the per hop values of their local streams) into a table.
+        """
+        streams = list(streams)
+        lengths = np.fromiter((len(st.path) for st in streams), dtype=np.int64, count=len(streams))
+        path_offsets = np.zeros(len(streams) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=path_offsets[1:])
+
+        alternatives = [p for st in streams for p in st.alternativePaths]
+        alt_offsets = np.zeros(len(streams) + 1, dtype=np.int64)
+        np.cumsum([len(st.alternativePaths) for st in streams], out=alt_offsets[1:])
+        alt_path_offsets = np.zeros(len(alternatives) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in alternatives], out=alt_path_offsets[1:])
+
+        table = StreamTable(links,
+                            labels=[st.label for st in streams],
+                            path_offsets=path_offsets,
+                            path_links=np.fromiter((l.index for st in streams for l in st.path), dtype=np.int32, count=int(path_offsets[-1])),
+                            priority=[st.priority for st in streams],
+                            rate=[st.rate for st in streams],
+                            burst=[st.burst for st in streams],
+                            minFrameSize=[st.minFrameSize for st in streams],
+                            maxFrameSize=[st.maxFrameSize for st in streams],
+                            ids=[st.id for st in streams],
+                            alt_offsets=alt_offsets,
+                            alt_path_offsets=alt_path_offsets,
+                            alt_path_links=np.fromiter((l.index for p in alternatives for l in p), dtype=np.int32, count=int(alt_path_offsets[-1])))
+        for name in HOP_COLUMNS:
+            getattr(table, name)[:] = [getattr(ls, "_" + name) for st in streams for ls in st.localStreams]
+        return table
+
+    def __getstate__(self) -> dict:
+        # the links belong to the topology, which re-attaches them (see Topology.__setstate__)
+        state = self.__dict__.copy()
+        state["links"] = None
+        del state["_views"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._views = weakref.WeakValueDictionary()
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __getitem__(self, row: int) -> TableStream:
+        view = self._views.get(row)
+        if view is None:
+            view = TableStream(self, row)
+            self._views[row] = view
+        return view
+
+    def __iter__(self) -> Iterator[TableStream]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def to_streams(self) -> List[Stream]:
+        """
+        returns regular Stream objects (with the same ids and per hop values) for all rows
+        """
+        columns = [(name, getattr(self, name).tolist()) for name in HOP_COLUMNS]
+        streams = []
+        for row in range(len(self)):
+            stream = Stream(self.labels[row], self.path(row), int(self.priority[row]), float(self.rate[row]), int(self.burst[row]), int(self.minFrameSize[row]), int(self.maxFrameSize[row]), self.alternative_paths(row))
+            stream._id = int(self.ids[row])
+            first = int(self.path_offsets[row])
+            for name, values in columns:
+                for hop, ls in enumerate(stream.localStreams, first):
+                    setattr(ls, "_" + name, values[hop])
+            streams.append(stream)
+        return streams
+
+    def json_dict(self, row: int) -> dict:
+        """
+        returns row in the format of Stream.to_json_dict(), read from the columns without creating a view
+        """
+        links = self.links
+        link_ids = self.path_link_ids(row).tolist()
+        d = {
+            "id": int(self.ids[row]),
+            "label": self.labels[row],
+            "path": [links[link_ids[0]].n1.name] + [links[i].n2.name for i in link_ids],
+            "priority": int(self.priority[row]),
+            "rate": float(self.rate[row]),
+            "burst": int(self.burst[row]),
+            "minFrameSize": int(self.minFrameSize[row]),
+            "maxFrameSize": int(self.maxFrameSize[row])
+        }
+        alternatives = self.alternative_paths(row)
+        if len(alternatives) > 0:
+            d["alternativePaths"] = [[p[0].n1.name] + [l.n2.name for l in p] for p in alternatives]
+        return d
+
+    @property
+    def num_hops(self) -> int:
+        return len(self.path_links)
+
+    def path_lengths(self) -> np.ndarray:
+        return np.diff(self.path_offsets)
+
+    def path_link_ids(self, row: int) -> np.ndarray:
+        return self.path_links[self.path_offsets[row]:self.path_offsets[row + 1]]
+
+    def path(self, row: int) -> List:
+        return [self.links[i] for i in self.path_link_ids(row).tolist()]
+
+    def alternative_paths(self, row: int) -> List[List]:
+        offsets = self.alt_path_offsets
+        return [[self.links[i] for i in self.alt_path_links[offsets[a]:offsets[a + 1]].tolist()] for a in range(self.alt_offsets[row], self.alt_offsets[row + 1])]
+
+    def hop_rows(self) -> np.ndarray:
+        """
+        returns the row of every hop, i.e. an array shaped like path_links
+        """
+        return np.repeat(np.arange(len(self), dtype=np.int64), self.path_lengths())
+
+
+class TableStream(Stream):
+    """
+    Stream view on one row of a StreamTable; behaves like a regular Stream.
+    """
+
+    def __init__(self, table: StreamTable, row: int) -> None:
+        self._table = table
+        self._row = row
+        self._localStreams = None
+
+    @property
+    def _id(self): return int(self._table.ids[self._row])
+
+    @property
+    def _label(self): return self._table.labels[self._row]
+
+    @property
+    def _path(self): return self._table.path(self._row)
+
+    @property
+    def _priority(self): return int(self._table.priority[self._row])
+
+    @property
+    def _rate(self): return float(self._table.rate[self._row])
+
+    @property
+    def _burst(self): return int(self._table.burst[self._row])
+
+    @property
+    def _minFrameSize(self): return int(self._table.minFrameSize[self._row])
+
+    @property
+    def _maxFrameSize(self): return int(self._table.maxFrameSize[self._row])
+
+    @property
+    def _alternativePaths(self): return self._table.alternative_paths(self._row)
+
+    @property
+    def localStreams(self) -> List[TableLocalStream]:
+        if self._localStreams is None:
+            first = int(self._table.path_offsets[self._row])
+            num = int(self._table.path_offsets[self._row + 1]) - first
+            self._localStreams = [TableLocalStream(self, i, hop) for i, hop in enumerate(range(first, first + num))]
+        return self._localStreams
+
+
+class TableMembership(object):
+    """
+    The rows of a StreamTable that are part of a topology, and the hops of these rows per link.
+
+    Only index arrays are kept; Stream/LocalStream views are created when streams are queried
+    (see Topology.get_streams_of_link() and Topology.get_all_streams()).
+    """
+
+    def __init__(self, table: StreamTable) -> None:
+        self.table = table
+        self.active = np.zeros(len(table), dtype=bool)
+        self._hops_by_link: np.ndarray = None
+        self._link_offsets: np.ndarray = None
+        self._hop_rows: np.ndarray = None
+
+    @property
+    def rows(self) -> np.ndarray:
+        return np.flatnonzero(self.active)
+
+    def _index(self) -> None:
+        # hops grouped by link id, the table's paths never change
+        self._hops_by_link = np.argsort(self.table.path_links, kind="stable")
+        self._link_offsets = np.zeros(int(self.table.path_links.max(initial=-1)) + 2, dtype=np.int64)
+        np.cumsum(np.bincount(self.table.path_links), out=self._link_offsets[1:])
+        self._hop_rows = self.table.hop_rows()
+
+    def hops_of_link(self, link_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        returns (rows, hops) of the active rows whose path contains the link
+        """
+        if self._hops_by_link is None:
+            self._index()
+
+        if link_id + 1 >= len(self._link_offsets):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        hops = self._hops_by_link[self._link_offsets[link_id]:self._link_offsets[link_id + 1]]
+        rows = self._hop_rows[hops]
+        active = self.active[rows]
+        return rows[active], hops[active]
+
+    def rows_on_links(self, link_ids: np.ndarray) -> np.ndarray:
+        """
+        returns the active rows whose path contains at least one of the links
+        """
+        if self._hops_by_link is None:
+            self._index()
+        mask = np.zeros(len(self._link_offsets), dtype=bool)
+        mask[link_ids[link_ids < len(mask)]] = True
+        rows = np.unique(self._hop_rows[mask[self.table.path_links]])
+        return rows[self.active[rows]]
+
+    def local_streams_of_link(self, link_id: int) -> List[TableLocalStream]:
+        rows, hops = self.hops_of_link(link_id)
+        offsets = self.table.path_offsets
+        return [self.table[row].localStreams[hop - offsets[row]] for row, hop in zip(rows.tolist(), hops.tolist())]
+
+
+def _hop_column(name: str) -> property:
+    def getter(self):
+        return getattr(self._s._table, name)[self._hop].item()
+
+    def setter(self, value):
+        getattr(self._s._table, name)[self._hop] = value
+
+    return property(getter, setter)
+
+
+class TableLocalStream(LocalStream):
+    """
+    LocalStream view on one hop of a StreamTable; the per hop values are read from and written to the table.
+    """
+
+    def __init__(self, parent_stream: TableStream, pathIndex: int, hop: int) -> None:
+        self._s = parent_stream
+        self._pathIndex = pathIndex
+        self._hop = hop
+
+    _accMaxLatency = _hop_column("accMaxLatency")
+    _accMinLatency = _hop_column("accMinLatency")
+    _accMinLatencyCQF = _hop_column("accMinLatencyCQF")
+    _accMaxLatencyCQF = _hop_column("accMaxLatencyCQF")
+    _maxIdleSlope = _hop_column("maxIdleSlope")
+
+    @property
+    def link(self): return self._s._table.links[self._s._table.path_links[self._hop]]
+
+
+class HopBatch(object):
+    """
+    The hops of a set of streams as flat arrays, for vectorized per hop computations.
+
+    The hops of stream k are link_ids[offsets[k]:offsets[k+1]]; priority, rate, burst and minFrameSize are given per hop.
+    Results are written back with write(), either into the LocalStream objects or into the StreamTable columns.
+    """
+
+    def __init__(self, link_ids: np.ndarray, offsets: np.ndarray, priority: np.ndarray, rate: np.ndarray, burst: np.ndarray, minFrameSize: np.ndarray, streams: List[Stream] = None, table: StreamTable = None, hops: np.ndarray = None) -> None:
+        self.link_ids = link_ids
+        self.offsets = offsets
+        self.priority = priority
+        self.rate = rate
+        self.burst = burst
+        self.minFrameSize = minFrameSize
+        self._streams = streams
+        self._table = table
+        self._hops = hops
+
+    @staticmethod
+    def of_streams(streams: Iterable[Stream], links: Sequence = None) -> List[HopBatch]:
+        """
+        returns one batch for all regular streams and one batch per StreamTable the remaining streams are views of
+
+        :param links: the links of the topology (indexed by Link.index) the streams must belong to;
+                      raises ValueError for a path over any other link
+        """
+        objects = []
+        tables = {}
+        for st in streams:
+            if isinstance(st, TableStream):
+                if links is not None and st._table.links is not links:
+                    raise ValueError(f"stream {st.label} belongs to a StreamTable of another topology")
+                tables.setdefault(id(st._table), (st._table, []))[1].append(st._row)
+            else:
+                objects.append(st)
+
+        batches = []
+        if len(objects) > 0:
+            lengths = np.fromiter((len(st.path) for st in objects), dtype=np.int64, count=len(objects))
+            offsets = np.zeros(len(objects) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            hop_links = [l for st in objects for l in st.path]
+            link_ids = np.fromiter((l.index for l in hop_links), dtype=np.int64, count=len(hop_links))
+            if links is not None:
+                foreign = np.flatnonzero((link_ids < 0) | (link_ids >= len(links)))
+                if len(foreign) == 0:
+                    foreign = [hop for hop, (i, l) in enumerate(zip(link_ids.tolist(), hop_links)) if links[i] is not l]
+                if len(foreign) > 0:
+                    st = objects[int(np.searchsorted(offsets, foreign[0], side="right")) - 1]
+                    raise ValueError(f"stream {st.label} uses link {hop_links[foreign[0]].name}, which is not part of this topology")
+            batches.append(HopBatch(link_ids=link_ids,
+                                    offsets=offsets,
+                                    priority=np.repeat(np.fromiter((st.priority for st in objects), dtype=np.int64, count=len(objects)), lengths),
+                                    rate=np.repeat(np.fromiter((st.rate for st in objects), dtype=np.float64, count=len(objects)), lengths),
+                                    burst=np.repeat(np.fromiter((st.burst for st in objects), dtype=np.float64, count=len(objects)), lengths),
+                                    minFrameSize=np.repeat(np.fromiter((st.minFrameSize for st in objects), dtype=np.float64, count=len(objects)), lengths),
+                                    streams=objects))
+
+        for table, rows in tables.values():
+            batches.append(HopBatch.of_table(table, np.array(rows, dtype=np.int64)))
+        return batches
+
+    @staticmethod
+    def of_table(table: StreamTable, rows: np.ndarray = None) -> HopBatch:
+        """
+        returns the batch of the given rows (all rows if None) of the table, without creating views
+        """
+        if rows is None or (len(rows) == len(table) and np.array_equal(rows, np.arange(len(table)))):
+            hops = np.arange(table.num_hops)
+            offsets = table.path_offsets
+            hop_rows = table.hop_rows()
+        else:
+            lengths = table.path_lengths()[rows]
+            offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            hop_rows = np.repeat(rows, lengths)
+            hops = table.path_offsets[hop_rows] + np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)
+        return HopBatch(link_ids=table.path_links[hops],
+                        offsets=offsets,
+                        priority=table.priority[hop_rows],
+                        rate=table.rate[hop_rows],
+                        burst=table.burst[hop_rows].astype(np.float64),
+                        minFrameSize=table.minFrameSize[hop_rows].astype(np.float64),
+                        table=table,
+                        hops=hops)
+
+    def write(self, attribute: str, values: np.ndarray) -> None:
+        """
+        :param attribute: LocalStream attribute, e.g. "_accMaxLatency"
+        """
+        if self._table is not None:
+            getattr(self._table, attribute.lstrip("_"))[self._hops] = values
+            return
+
+        values = values.tolist()
+        k = 0
+        for st in self._streams:
+            for ls in st.localStreams:
+                setattr(ls, attribute, values[k])
+                k += 1
+
+
+def segmented_exclusive_cumsum(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Exclusive cumulative sum restarting at every segment start, i.e. for every segment [0, v0, v0+v1, ...].
+
+    Accumulates hop position by hop position (one vectorized step per position of the longest segment),
+    so every sum is rounded exactly like a sequential sum over its own segment.
+    """
+    result = np.zeros(len(values))
+    lengths = np.diff(offsets)
+    # segments by decreasing length, so the ones longer than any position p are a prefix
+    by_length = np.argsort(-lengths, kind="stable")
+    starts = np.asarray(offsets[:-1])[by_length]
+    neg_lengths = -lengths[by_length]
+    for p in range(1, int(lengths.max(initial=0))):
+        hops = starts[:np.searchsorted(neg_lengths, -p, side="left")] + p
+        result[hops] = result[hops - 1] + values[hops - 1]
+    return result
@@ -3,38 +3,60 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 
 import numpy as np
-from numpy import cumsum
-from queue import Queue
-from typing import Dict, List, Tuple, Iterable, Set
+from typing import Dict, List, Tuple, Iterable, Iterator, Set, Optional, Union
 
 import lib.stream as s
+from lib.instrumentation import timed, count
+from lib.compact_graph import CompactGraph
+from lib import paths
+from lib.stream_table import StreamTable, TableStream, TableMembership, HopBatch, segmented_exclusive_cumsum
 
 
-@dataclass(eq=True, unsafe_hash=True, order=True)
+@dataclass(eq=True, order=True)
 class Node(object):
     name: str = field(hash=True)
     type: str = field(hash=True, compare=False)
     neighs: List[Link] = field(default_factory=list, compare=False, hash=False, repr=False)
     lastUsedPort: int = field(default=-1, compare=False, repr=False)
     joinPoint: bool = field(default=False, compare=False, repr=False)
+    index: int = field(default=-1, init=False, compare=False, hash=False, repr=False)
+    """
+    Position of this node in Topology.nodes, -1 as long as the node is not part of a topology.
+    """
+    _topo: Optional[Topology] = field(default=None, init=False, compare=False, hash=False, repr=False)
+
+    VALID_TYPES = ("switch", "host", "controller", "sensor")
 
     def __post_init__(self) -> None:
         if "-" in self.name: raise ValueError("Node name may not contain '-'")
-        valid_types = ("switch", "host", "controller", "sensor")
-        if self.type not in valid_types:
-            raise ValueError("Node type must be one of %s, not %s" % (valid_types, self.type))
+        if self.type not in Node.VALID_TYPES:
+            raise ValueError("Node type must be one of %s, not %s" % (Node.VALID_TYPES, self.type))
 
     def addNeigh(self, n2: Node, bw: float) -> None:
-        if n2 not in [l.get_other(self) for l in self.neighs]:
+        if not self.isNeighbor(n2):
             inport = self.setAndGetNextPort()
             outport = n2.setAndGetNextPort()
-            self.neighs.append(Link(self, n2, bw, inport, outport))
-            n2.neighs.append(Link(n2, self, bw, outport, inport))
+            l1 = Link(self, n2, bw, inport, outport)
+            l2 = Link(n2, self, bw, outport, inport)
+            self.neighs.append(l1)
+            n2.neighs.append(l2)
+
+            if self._topo is not None and self._topo is n2._topo:
+                self._topo._register_link(l1)
+                self._topo._register_link(l2)
+
+    def isNeighbor(self, n2: Node) -> bool:
+        if self._topo is not None and self._topo is n2._topo:
+            return (self.index, n2.index) in self._topo._links_by_pair
+        return n2 in [l.get_other(self) for l in self.neighs]
 
     def setAndGetNextPort(self) -> int:
         self.lastUsedPort += 1
         return self.lastUsedPort
 
+    def __hash__(self) -> int:
+        return hash(self.name)
+
     def numNeighorSwitches(self) -> int:
         return len([l for l in self.neighs if l.get_other(self).type == "switch"])
 
@@ -69,6 +91,18 @@ class Link(object):
     bandwidth: float = field(hash=True)
     egressPortN1: int = field(hash=True, repr=False)
     ingressPortN2: int = field(hash=True, repr=False)
+    index: int = field(default=-1, init=False, compare=False, hash=False, repr=False)
+    """
+    Stable id of this link within its topology (see Topology.core), -1 as long as the link is not registered.
+    """
+    _hash: Optional[int] = field(default=None, init=False, compare=False, hash=False, repr=False)
+
+    def __hash__(self) -> int:
+        # Links are hashed for every streams_per_link/max_delays access, so cache it.
+        # The hash depends on the node names, see Topology.reset_with_prefix()
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash((self.n1.name, self.n2.name, self.bandwidth, self.egressPortN1, self.ingressPortN2)))
+        return self._hash
 
     @property
     def name(self) -> str:
@@ -104,9 +138,42 @@ class Link(object):
 
 
 class Topology(object):
+    COST_MODELS = ("hops", "inverse_bandwidth", "delay", "residual")
+    """
+    Link costs for routing, see link_costs()
+    """
+    REFERENCE_BANDWIDTH = 1e10
+    """
+    Bit/s; with cost model "inverse_bandwidth", a link of this bandwidth costs 1
+    """
+
     def __init__(self, max_delays: Dict[Link, Tuple] = None, max_bandwidths: Dict[Link, Tuple] = None, max_queues: Dict[Link, Tuple] = None) -> None:
         self.nodes: List[Node] = []
+        self._links: List[Link] = []
+        """
+        All links of this topology, indexed by Link.index.
+        """
+        self._core: Optional[CompactGraph] = None
+
+        # Lookup indexes, maintained incrementally by add_node() and _register_link()
+        self._nodes_by_name: Dict[str, Node] = {}
+        self._nodes_by_type: Dict[str, List[Node]] = {t: [] for t in Node.VALID_TYPES}
+        self._hosts: List[Node] = []
+        self._links_by_name: Dict[str, Link] = {}
+        self._links_by_pair: Dict[Tuple[int, int], Link] = {}
+        """
+        (n1.index, n2.index) -> link
+        """
+
         self.streams_per_link: Dict[Link, Dict[int, s.LocalStream]] = {}
+        """
+        The regular Stream objects per link, {link -> {stream id -> local stream}}; rows of added StreamTables are kept in _tables.
+        """
+        self._tables: Dict[int, TableMembership] = {}
+        """
+        id(table) -> the rows of that StreamTable that are part of this topology
+        """
+        self._num_object_streams = 0
         self.max_delays: Dict[Link, Tuple] = max_delays
         """
         The max_delays (per_hop_guarantees) are defined per link and per priority.
@@ -127,44 +194,126 @@ class Topology(object):
         
         max_queue_sizes := {linkname -> (q0, q1, q2, q3, q4, q5, q6, q7)}
         """
+        self._link_loads = np.zeros((3, 0, 8))
+        """
+        Running sums over all streams per link and priority: [rate, burst, stream count][link.index, priority].
+        Maintained by add_streams() and remove_stream(), see link_rates, link_bursts and link_stream_counts.
+        """
+        self._max_delays_array: Optional[np.ndarray] = None
+        """
+        max_delays as array (link.index x priority), NaN where undefined; built lazily, kept in sync by update_guarantees_dict()
+        """
+        self._max_bandwidths_array: Optional[np.ndarray] = None
+        """
+        max_bandwidths as array (link.index x priority), NaN where undefined; built lazily for the current max_bandwidths dict,
+        kept in sync by update_idle_slopes_all_links()
+        """
+        self._max_bandwidths_source: Optional[Dict[Link, Tuple]] = None
+
+    @property
+    def core(self) -> CompactGraph:
+        """
+        Integer/CSR representation of the current topology, built lazily and dropped on every mutation.
+        """
+        if self._core is None:
+            self._core = CompactGraph(self)
+        return self._core
+
+    # The following properties return the internal indexes, do not modify the returned lists.
 
     @property
     def links(self) -> Iterable[Link]:
-        all_neighs = [n.neighs for n in self.nodes]
-        return set().union(*all_neighs)
+        return self._links
 
     @property
     def hosts(self) -> List[Node]:
-        return [n for n in self.nodes if n.type in {"host", "controller", "sensor"}]
+        return self._hosts
 
     @property
     def controllers(self) -> List[Node]:
-        return [n for n in self.nodes if n.type == "controller"]
+        return self._nodes_by_type["controller"]
 
     @property
     def sensors(self) -> List[Node]:
-        return [n for n in self.nodes if n.type == "sensor"]
+        return self._nodes_by_type["sensor"]
 
     @property
     def switches(self) -> List[Node]:
-        return [n for n in self.nodes if n.type == "switch"]
+        return self._nodes_by_type["switch"]
+
+    @property
+    def link_rates(self) -> np.ndarray:
+        """
+        Sum of the stream rates per link and priority, i.e. link_rates[link.index, priority]
+        """
+        return self._get_link_loads()[0]
+
+    @property
+    def link_bursts(self) -> np.ndarray:
+        """
+        Sum of the stream bursts per link and priority, i.e. link_bursts[link.index, priority]
+        """
+        return self._get_link_loads()[1]
+
+    @property
+    def link_stream_counts(self) -> np.ndarray:
+        """
+        Number of streams per link and priority (as float), i.e. link_stream_counts[link.index, priority]
+        """
+        return self._get_link_loads()[2]
+
+    def _get_link_loads(self) -> np.ndarray:
+        if self._link_loads.shape[1] < len(self._links):
+            grown = np.zeros((3, max(len(self._links), 2 * self._link_loads.shape[1]), self._link_loads.shape[2]))
+            grown[:, :self._link_loads.shape[1]] = self._link_loads
+            self._link_loads = grown
+        return self._link_loads[:, :len(self._links)]
+
+    def _update_link_loads(self, batches: Iterable[HopBatch], sign: int) -> None:
+        loads = self._get_link_loads()
+        for batch in batches:
+            np.add.at(loads[0], (batch.link_ids, batch.priority), sign * batch.rate)
+            np.add.at(loads[1], (batch.link_ids, batch.priority), sign * batch.burst)
+            np.add.at(loads[2], (batch.link_ids, batch.priority), sign)
+        self._drop_routes("residual")
+
+    def get_link_utilization(self, link: Link, priority: int = None) -> float:
+        """
+        returns the rate of all streams on the link relative to the link bandwidth,
+        or, if a priority is given, the rate of this priority relative to max_bandwidths[link][priority]
+        """
+        if priority == None:
+            return self.link_rates[link.index].sum() / link.bandwidth
+        return self.link_rates[link.index, priority] / self.max_bandwidths[link][priority]
 
     @property
     def joinPoints(self) -> List[Node]:
         return [n for n in self.nodes if n.joinPoint]
 
     def getDanglingSwitches(self) -> List[Node]:
-        return [n for n in self.nodes if n.type == "switch" and n.numNeighorSwitches() == 1]
+        return [n for n in self.switches if n.numNeighorSwitches() == 1]
 
     def reset_with_prefix(self, prefix: str) -> Topology:
         # Clear everything that might use the has of nodes internally
         self.streams_per_link.clear()
+        self._tables.clear()
+        self._num_object_streams = 0
+        self._link_loads[:] = 0
         if self.max_delays: self.max_delays.clear()
         if self.max_bandwidths: self.max_bandwidths.clear()
         if self.max_queue_sizes: self.max_queue_sizes.clear()
+        self._max_delays_array = None
+        self._max_bandwidths_array = None
+        self._drop_routes("delay", "residual")
 
         for node in self.nodes:
             node.name = prefix + node.name
+        for link in self._links:
+            object.__setattr__(link, "_hash", None)
+
+        # the name based indexes are rebuilt, the (integer) pair and type indexes stay valid
+        self._nodes_by_name = {n.name: n for n in self.nodes}
+        self._links_by_name = {l.name: l for l in self._links}
 
         return self
 
@@ -172,90 +321,374 @@ class Topology(object):
         return {
             "nodes": self.nodes,
             "links": list(self.links),
-            "streams": sorted(list(self.get_all_streams()), key=lambda x: x.id)
+            "streams": self.get_all_streams_sorted()
         }
 
+    def __getstate__(self) -> dict:
+        # Pickle a flat, index based form; pickling the Node/Link object graph recurses along every path.
+        # The regular Stream objects are stored as one StreamTable (with their per hop values) and come back as
+        # Stream objects, added StreamTables come back as tables with the same rows. Further attributes set on
+        # Stream/LocalStream objects are not kept.
+        objects = self._object_streams()
+        streams = StreamTable.from_streams(self._links, [objects[id] for id in sorted(objects)])
+        tables = [(m.table, m.rows) for m in self._tables.values() if m.active.any()]
+
+        def by_index(d: Dict[Link, Tuple]) -> Optional[Dict[int, Tuple]]:
+            return None if d == None else {l.index: t for l, t in d.items()}
+
+        return {
+            "nodes": [(n.name, n.type, n.joinPoint, n.lastUsedPort) for n in self.nodes],
+            "neighs": [[l.index for l in n.neighs] for n in self.nodes],
+            "links": [(l.n1.index, l.n2.index, l.bandwidth, l.egressPortN1, l.ingressPortN2) for l in self._links],
+            "streams": streams,
+            "tables": tables,
+            "max_delays": by_index(self.max_delays),
+            "max_bandwidths": by_index(self.max_bandwidths),
+            "max_queue_sizes": by_index(self.max_queue_sizes),
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__()
+
+        for name, type, joinPoint, lastUsedPort in state["nodes"]:
+            n = self.add_node(Node(name, type, joinPoint=joinPoint))
+            n.lastUsedPort = lastUsedPort
+        for n1, n2, bandwidth, egressPortN1, ingressPortN2 in state["links"]:
+            self._register_link(Link(self.nodes[n1], self.nodes[n2], bandwidth, egressPortN1, ingressPortN2))
+        for n, neighs in zip(self.nodes, state["neighs"]):
+            n.neighs = [self._links[i] for i in neighs]
+
+        def by_link(d: Optional[Dict[int, Tuple]]) -> Optional[Dict[Link, Tuple]]:
+            return None if d == None else {self._links[i]: t for i, t in d.items()}
+
+        self.max_delays = by_link(state["max_delays"])
+        self.max_bandwidths = by_link(state["max_bandwidths"])
+        self.max_queue_sizes = by_link(state["max_queue_sizes"])
+
+        streams = state["streams"]
+        streams.links = self._links
+        self.add_streams(streams.to_streams())
+        for table, rows in state["tables"]:
+            table.links = self._links
+            self.add_streams(table if len(rows) == len(table) else [table[row] for row in rows.tolist()])
+
+        # the restored ids are taken, like after from_json()
+        for table in [streams] + [table for table, _ in state["tables"]]:
+            if len(table) > 0:
+                s.Stream.LAST_ID = max(s.Stream.LAST_ID, int(table.ids.max()))
+
     def add_node(self, n: Node) -> Node:
-        if n not in self.nodes:
+        if n._topo is not None and n._topo is not self:
+            raise ValueError(f"Node {n.name} is already part of another topology.")
+        if n.name not in self._nodes_by_name:
+            n.index = len(self.nodes)
+            n._topo = self
             self.nodes.append(n)
+            self._nodes_by_name[n.name] = n
+            self._nodes_by_type[n.type].append(n)
+            if n.is_host:
+                self._hosts.append(n)
+            self._core = None
+
+            # links created before n became part of this topology
+            for l in n.neighs:
+                if l.index < 0 and l.n2._topo is self:
+                    self._register_link(l)
+                    self._register_link(next(l2 for l2 in l.n2.neighs if l2.n2 is n))
         else:
             raise ValueError(f"Node {n.name} is already part of this topology.")
         return n
 
+    def _register_link(self, l: Link) -> None:
+        object.__setattr__(l, "index", len(self._links))
+        self._links.append(l)
+        self._links_by_name[l.name] = l
+        self._links_by_pair[(l.n1.index, l.n2.index)] = l
+        self._core = None
+
+    def _link_index(self, link: Link) -> int:
+        """
+        Link.index of `link`, or of the link of this topology that equals it (e.g. a Link.mirror() copy)
+        """
+        if 0 <= link.index < len(self._links) and self._links[link.index] is link:
+            return link.index
+        own = self._links_by_name.get(link.name)
+        if own is None or own != link:
+            raise KeyError(link)
+        return own.index
+
+    def _node_index(self, n: Node) -> int:
+        if n._topo is self:
+            return n.index
+        if n.name in self._nodes_by_name:
+            return self._nodes_by_name[n.name].index
+        raise ValueError(f"Node {n.name} is not part of this topology")
+
     def create_and_add_links(self, n1: Node, n2: Node, bandwidth: float) -> Node:
         """
         :param bandwidth: in Bit/s
 
         returns n2
         """
-        if n1 not in self.nodes:
+        if n1.name not in self._nodes_by_name:
             self.add_node(n1)
-        if n2 not in self.nodes:
+        if n2.name not in self._nodes_by_name:
             self.add_node(n2)
         n1.addNeigh(n2, bandwidth)
         #return (n1.neighs[-1], n2.neighs[-1])
         return n2
 
+    def has_node(self, nodename: str) -> bool:
+        return nodename in self._nodes_by_name
+
+    def get_node_by_name(self, nodename: str) -> Node:
+        try:
+            return self._nodes_by_name[nodename]
+        except KeyError:
+            raise ValueError(f"node '{nodename}' not found") from None
+
     def get_link(self, n1: Node, n2: Node) -> Link:
-        for i,l in enumerate(n1.neighs):
-            if l.n2 == n2:
+        if n1._topo is self and n2._topo is self:
+            l = self._links_by_pair.get((n1.index, n2.index))
+            if l is not None:
                 return l
+        else:
+            for l in n1.neighs:
+                if l.n2 == n2:
+                    return l
         raise ValueError("link '%s-%s' not found" % (n1.name, n2.name))
 
     def get_link_by_name(self, linkname: str) -> Link:
-        for l in self.links:
-            if l.name == linkname:
-                return l
-        raise ValueError(f"link '{linkname}' not found")
+        try:
+            return self._links_by_name[linkname]
+        except KeyError:
+            raise ValueError(f"link '{linkname}' not found") from None
 
     def add_stream(self, stream: s.Stream) -> None:
-        for i, link in enumerate(stream.path):
-            if link not in self.streams_per_link:
-                self.streams_per_link[link] = {}
-            self.streams_per_link[link][stream.id] = stream.localStreams[i]
+        self.add_streams([stream])
+
+    @timed()
+    def add_streams(self, streams: Union[Iterable[s.Stream], StreamTable]) -> None:
+        """
+        :param streams: Stream objects or a StreamTable; the rows of a table (and table views) are kept as
+                        row indexes, views are only created when the streams are queried (see TableMembership)
+        """
+        objects = []
+        tables = {}
+        if isinstance(streams, StreamTable):
+            tables[id(streams)] = (streams, np.arange(len(streams)))
+        else:
+            for stream in streams:
+                if isinstance(stream, TableStream):
+                    tables.setdefault(id(stream._table), (stream._table, []))[1].append(stream._row)
+                else:
+                    objects.append(stream)
+
+        # validates that all paths use links of this topology, before anything is changed
+        batches = HopBatch.of_streams(objects, self._links)
+        for table, _ in tables.values():
+            if table.links is not self._links:
+                raise ValueError("the StreamTable belongs to another topology")
+
+        new_streams = []
+        for stream in objects:
+            stream_id = stream.id
+            path = stream.path
+            localStreams = stream.localStreams
+            if stream_id not in self.streams_per_link.get(path[0], ()):
+                new_streams.append(stream)
+            for i, link in enumerate(path):
+                innerdict = self.streams_per_link.get(link)
+                if innerdict == None:
+                    innerdict = self.streams_per_link[link] = {}
+                innerdict[stream_id] = localStreams[i]
+        self._num_object_streams += len(new_streams)
+        new_batches = HopBatch.of_streams(new_streams)
+        num_new = len(new_streams)
+
+        for table, rows in tables.values():
+            rows = np.asarray(rows, dtype=np.int64)
+            membership = self._tables.get(id(table))
+            if membership is None:
+                membership = self._tables[id(table)] = TableMembership(table)
+            new_rows = np.unique(rows[~membership.active[rows]])
+            membership.active[new_rows] = True
+            batch = HopBatch.of_table(table, rows)
+            batches.append(batch)
+            if len(new_rows) == len(rows):
+                new_batches.append(batch)
+            elif len(new_rows) > 0:
+                new_batches.append(HopBatch.of_table(table, new_rows))
+            num_new += len(new_rows)
+
+        self._update_link_loads(new_batches, +1)
+        count("streams", num_new)
 
         if self.max_delays != None:
-            self.update_acc_latencies(stream)
+            self._write_acc_latencies(batches)
 
         if self.max_bandwidths != None:
-            self.update_idle_slope_stream(stream)
-
-    def add_streams(self, streams: Iterable[s.Stream]) -> None:
-        for s in streams:
-            self.add_stream(s)
+            self._write_idle_slopes(batches)
 
     def remove_stream(self, stream: s.Stream) -> None:
+        membership = self._tables.get(id(stream._table)) if isinstance(stream, TableStream) else None
+        if membership is not None:
+            if not membership.active[stream._row]:
+                raise KeyError(stream.id)
+            membership.active[stream._row] = False
+            self._update_link_loads([HopBatch.of_table(stream._table, np.array([stream._row]))], -1)
+            return
+
         for link in stream.path:
             del self.streams_per_link[link][stream.id]
+        self._num_object_streams -= 1
+        self._update_link_loads(HopBatch.of_streams([stream], self._links), -1)
 
     def remove_all_streams(self) -> None:
         self.streams_per_link = {}
+        self._tables = {}
+        self._num_object_streams = 0
+        self._link_loads[:] = 0
+        self._drop_routes("residual")
+
+    @property
+    def num_streams(self) -> int:
+        """
+        number of streams, without creating views for table rows
+        """
+        return self._num_object_streams + sum(int(m.active.sum()) for m in self._tables.values())
 
     def get_streams_of_link(self, link: Link) -> Iterable[s.LocalStream]:
-        return self.streams_per_link.get(link, {}).values()
+        local_streams = self.streams_per_link.get(link, {}).values()
+        if len(self._tables) == 0:
+            return local_streams
+        return list(local_streams) + [ls for m in self._tables.values() for ls in m.local_streams_of_link(link.index)]
 
     def get_all_streams(self) -> Set[s.Stream]:
         all_sets = [{x.s for x in innerdict.values()} for innerdict in self.streams_per_link.values()]
+        all_sets += [{m.table[row] for row in m.rows.tolist()} for m in self._tables.values()]
         return set().union(*all_sets)
 
-    def update_acc_latencies(self, stream: s.Stream) -> None:
-        accMaxLatencies = cumsum([self.max_delays[link][stream.priority] for link in stream.path])
-        accMinLatencies = cumsum([stream.minFrameSize / (link.bandwidth / 1e9) for link in stream.path])
+    def _object_streams(self) -> Dict[int, s.Stream]:
+        """
+        the regular Stream objects by id
+        """
+        objects = {}
+        for innerdict in self.streams_per_link.values():
+            for id, localStream in innerdict.items():
+                objects[id] = localStream.s
+        return objects
 
-        accMaxLatencies = np.insert(accMaxLatencies, 0, 0)
-        accMinLatencies = np.insert(accMinLatencies, 0, 0)
+    def get_all_streams_sorted(self) -> List[s.Stream]:
+        """
+        returns all streams sorted by id (without hashing the streams themselves)
+        """
+        streams = {}
+        for innerdict in self.streams_per_link.values():
+            for id, localStream in innerdict.items():
+                streams[id] = localStream.s
+        for m in self._tables.values():
+            for row, id in zip(m.rows.tolist(), m.table.ids[m.active].tolist()):
+                streams[id] = m.table[row]
+        return [streams[id] for id in sorted(streams)]
+
+    def stream_json_dicts_sorted(self) -> Iterator[dict]:
+        """
+        to_json_dict() of all streams sorted by id, like get_all_streams_sorted();
+        table rows are read from their columns without creating views
+        """
+        objects = self._object_streams()
+        tables = [(m.table, m.rows) for m in self._tables.values()]
+        ids = np.concatenate([np.fromiter(objects, dtype=np.int64, count=len(objects))] + [table.ids[rows] for table, rows in tables])
+        if len(ids) == 0:
+            return
+        sources = np.repeat(np.arange(-1, len(tables)), [len(objects)] + [len(rows) for _, rows in tables])
+        rows = np.concatenate([np.full(len(objects), -1, dtype=np.int64)] + [rows for _, rows in tables])
+
+        # the last entry of every id wins, like in get_all_streams_sorted()
+        order = np.argsort(ids, kind="stable")
+        order = order[np.append(ids[order][1:] != ids[order][:-1], True)]
+        for id, source, row in zip(ids[order].tolist(), sources[order].tolist(), rows[order].tolist()):
+            yield objects[id].to_json_dict() if source < 0 else tables[source][0].json_dict(row)
+
+    def _all_stream_batches(self) -> List[HopBatch]:
+        """
+        the hops of all streams, table rows without creating views
+        """
+        batches = HopBatch.of_streams(self._object_streams().values())
+        batches += [HopBatch.of_table(m.table, m.rows) for m in self._tables.values() if m.active.any()]
+        return batches
 
-        for i, link in enumerate(stream.path):
-            stream.localStreams[i]._accMaxLatency = accMaxLatencies[i]
-            stream.localStreams[i]._accMinLatency = accMinLatencies[i]
+    def update_acc_latencies(self, stream: s.Stream) -> None:
+        self.update_acc_latencies_bulk([stream])
 
+    def update_acc_latencies_bulk(self, streams: Iterable[s.Stream]) -> None:
+        """
+        Computes _accMaxLatency/_accMinLatency for all hops of all given streams at once
+        (segmented cumsum over the concatenated paths).
+        """
+        self._write_acc_latencies(HopBatch.of_streams(streams, self._links))
+
+    def _write_acc_latencies(self, batches: Iterable[HopBatch]) -> None:
+        max_delays = self._get_max_delays_array()
+        bandwidths = self.core.bandwidths
+
+        for batch in batches:
+            hop_max_delays = max_delays[batch.link_ids, batch.priority]
+            undefined = np.flatnonzero(np.isnan(hop_max_delays))
+            if len(undefined) > 0:
+                raise KeyError(self._links[batch.link_ids[undefined[0]]])
+            hop_min_delays = batch.minFrameSize / (bandwidths[batch.link_ids] / 1e9)
+
+            batch.write("_accMaxLatency", segmented_exclusive_cumsum(hop_max_delays, batch.offsets))
+            batch.write("_accMinLatency", segmented_exclusive_cumsum(hop_min_delays, batch.offsets))
+
+    def _get_max_delays_array(self) -> np.ndarray:
+        if self._max_delays_array is None or len(self._max_delays_array) != len(self._links):
+            width = max([8] + [len(t) for t in self.max_delays.values()])
+            self._max_delays_array = np.full((len(self._links), width), np.nan)
+            for link, t in self.max_delays.items():
+                self._max_delays_array[self._link_index(link), :len(t)] = t
+        return self._max_delays_array
+
+    @timed("update_guarantees")
     def update_guarantees_dict(self, guarantees_dict: Dict[Link, Tuple]) -> None:
+        """
+        Only the streams traversing links whose guarantees actually changed are updated.
+        Raises KeyError (before changing anything) if a link is not part of this topology.
+        """
+        indexes = {link: self._link_index(link) for link in guarantees_dict}
         if not self.max_delays:
             self.max_delays = {}
+
+        changed = []
         for link, tuple in guarantees_dict.items():
-            self.max_delays[link] = tuple
-        for stream in self.get_all_streams():
-            self.update_acc_latencies(stream)
+            if self.max_delays.get(link) != tuple:
+                self.max_delays[link] = tuple
+                changed.append(link)
+
+        if self._max_delays_array is not None:
+            for link in changed:
+                t = self.max_delays[link]
+                if indexes[link] >= len(self._max_delays_array) or len(t) > self._max_delays_array.shape[1]:
+                    self._max_delays_array = None
+                    break
+                self._max_delays_array[indexes[link]] = np.nan
+                self._max_delays_array[indexes[link], :len(t)] = t
+        if len(changed) > 0:
+            self._drop_routes("delay")
+
+        affected = {}
+        for link in changed:
+            for ls in self.streams_per_link.get(link, {}).values():
+                affected[ls.id] = ls.s
+        batches = HopBatch.of_streams(affected.values())
+        link_ids = np.fromiter((indexes[link] for link in changed), dtype=np.int64, count=len(changed))
+        for m in self._tables.values():
+            rows = m.rows_on_links(link_ids)
+            if len(rows) > 0:
+                batches.append(HopBatch.of_table(m.table, rows))
+        self._write_acc_latencies(batches)
 
     def update_guarantees_all_links(self, link_guarantees: Tuple) -> None:
         guarantees_dict = {}
@@ -267,74 +700,163 @@ class Topology(object):
         self.max_bandwidths = {}
         for link in self.links:
             self.max_bandwidths[link] = max_idle_slopes
-        for stream in self.get_all_streams():
-            self.update_idle_slope_stream(stream)
+        self._max_bandwidths_array = np.full((len(self._links), max(8, len(max_idle_slopes))), np.nan)
+        self._max_bandwidths_array[:, :len(max_idle_slopes)] = max_idle_slopes
+        self._max_bandwidths_source = self.max_bandwidths
+        self._drop_routes("residual")
+        self._write_idle_slopes(self._all_stream_batches())
 
     def update_idle_slope_stream(self, stream: s.Stream) -> None:
-        for i, link in enumerate(stream.path):
-            stream.localStreams[i]._maxIdleSlope = self.max_bandwidths[link][stream.priority]
+        self.update_idle_slopes_bulk([stream])
+
+    def update_idle_slopes_bulk(self, streams: Iterable[s.Stream]) -> None:
+        self._write_idle_slopes(HopBatch.of_streams(streams, self._links))
+
+    def _get_max_bandwidths_array(self) -> np.ndarray:
+        # rebuilt only if max_bandwidths was replaced or links were added since
+        if self._max_bandwidths_array is None or self._max_bandwidths_source is not self.max_bandwidths or len(self._max_bandwidths_array) != len(self._links):
+            width = max([8] + [len(t) for t in self.max_bandwidths.values()])
+            self._max_bandwidths_array = np.full((len(self._links), width), np.nan)
+            for link, t in self.max_bandwidths.items():
+                self._max_bandwidths_array[self._link_index(link), :len(t)] = t
+            self._max_bandwidths_source = self.max_bandwidths
+        return self._max_bandwidths_array
+
+    def _write_idle_slopes(self, batches: Iterable[HopBatch]) -> None:
+        max_bandwidths = self._get_max_bandwidths_array()
+
+        for batch in batches:
+            hop_idle_slopes = max_bandwidths[batch.link_ids, batch.priority]
+            undefined = np.flatnonzero(np.isnan(hop_idle_slopes))
+            if len(undefined) > 0:
+                raise KeyError(self._links[batch.link_ids[undefined[0]]])
+            batch.write("_maxIdleSlope", hop_idle_slopes)
 
     def update_queue_sizes_all_links(self, max_queue_sizes: Tuple) -> None:
         self.max_queue_sizes = {}
         for link in self.links:
             self.max_queue_sizes[link] = max_queue_sizes
 
-    def shortest_path(self, n1: Node, n2: Node) -> List[Link]:
-        pi = {}
-        pi[n1] = None
+    def shortest_path(self, n1: Node, n2: Node, cost_model: str = "hops", priority: int = None) -> List[Link]:
+        """
+        :param cost_model: minimize the sum of these link costs instead of the hop count, see link_costs()
+        :param priority: of the routed stream, for the cost models "delay" and "residual"
+        """
+        source, target = self._node_index(n1), self._node_index(n2)
+        if cost_model == "hops":
+            link_ids = self.core.path_link_ids(source, target)
+        else:
+            link_ids = self.router(cost_model, priority).path_link_ids(source, target)
+        if link_ids is None:
+            raise ValueError("No path from %s to %s exists" % (n1.name, n2.name))
+        return [self._links[i] for i in link_ids]
 
-        q = Queue()
-        q.put(n1)
+    def link_costs(self, cost_model: str, priority: int = None, pending_rates: np.ndarray = None) -> np.ndarray:
+        """
+        Routing cost per link (indexed by Link.index); inf marks links that must not be used.
 
-        while not q.empty():
-            node = q.get()
+        :param pending_rates: for "residual", rates of streams that are not added yet (e.g. placed earlier in the same batch)
+                              and count as load as well; shaped like link_rates
 
-            if node == n2:
-                path = []
-                while node != None:
-                    path.insert(0, node)
-                    node = pi[node]
-                return self.nodes_to_links(path)
+        - "hops": 1 per link
+        - "inverse_bandwidth": REFERENCE_BANDWIDTH / bandwidth, i.e. prefer fast links
+        - "delay": the per hop guarantee max_delays[link][priority]; links without one are not used
+        - "residual": capacity / (capacity - rate of the added streams), i.e. 1 on idle links, growing with the load,
+          inf on full links; the capacity is max_bandwidths[link][priority] if defined (with a priority), otherwise
+          the link bandwidth shared by all priorities
+        """
+        core = self.core
+        if cost_model == "hops":
+            return np.ones(core.num_links)
+        if cost_model == "inverse_bandwidth":
+            return self.REFERENCE_BANDWIDTH / core.bandwidths
+        if cost_model == "delay":
+            if not self.max_delays or priority == None:
+                raise ValueError("cost model 'delay' needs max_delays and a priority")
+            costs = self._get_max_delays_array()[:, priority]
+            return np.where(np.isnan(costs), np.inf, costs)
+        if cost_model == "residual":
+            rates = self.link_rates if pending_rates is None else self.link_rates + pending_rates
+            if self.max_bandwidths and priority != None:
+                capacity = self._get_max_bandwidths_array()[:, priority]
+                capacity = np.where(np.isnan(capacity), core.bandwidths, capacity)
+                load = rates[:, priority]
+            else:
+                capacity = core.bandwidths
+                load = rates.sum(axis=1)
+            residual = capacity - load
+            with np.errstate(divide="ignore"):
+                return np.where(residual > 0, capacity / residual, np.inf)
+        raise ValueError(f"unknown cost model '{cost_model}', valid are {self.COST_MODELS}")
+
+    def router(self, cost_model: str, priority: int = None) -> paths.CostRouter:
+        """
+        Cheapest path queries (on node and link ids) under the link_costs() of the cost model, with cached Dijkstra trees.
 
-            for link in node.neighs:
-                neigh = link.get_other(node)
-                if neigh not in pi:
-                    q.put(neigh)
-                    pi[neigh] = node
+        Routers are cached per cost model and priority. Mutations drop all of them; adding or removing streams drops
+        the "residual" ones and update_guarantees_dict() the "delay" ones, so later queries see the new costs.
+        """
+        if cost_model in ("hops", "inverse_bandwidth"):
+            priority = None
+        routers = self.core.derived.setdefault("routers", {})
+        router = routers.get((cost_model, priority))
+        if router is None:
+            router = paths.CostRouter(self.core, None if cost_model == "hops" else self.link_costs(cost_model, priority))
+            routers[(cost_model, priority)] = router
+        return router
+
+    def _drop_routes(self, *cost_models: str) -> None:
+        """
+        Drops the routers and cached paths of these cost models, after their link costs changed
+        """
+        if self._core is None:
+            return
+        for cache in (self._core.derived.get("routers", {}), self._core.derived.get("paths", {})):
+            for key in [key for key in cache if key[0] in cost_models]:
+                del cache[key]
 
-        raise ValueError("No path from %s to %s exists" % (n1.name, n2.name))
+    @property
+    def path_cache(self) -> Dict[Tuple, List[List[Link]]]:
+        """
+        Memoized results of k_shortest_paths() and disjoint_paths(), keyed by (cost_model, priority, kind, n1.index, n2.index, k).
+        Part of the core snapshot, so every mutation (e.g. addNeigh) clears it.
+        """
+        return self.core.derived.setdefault("paths", {})
 
-    def nodes_to_links(self, nodelist: List[Node]) -> List[Link]:
-        linklist: List[Link] = [None] * (len(nodelist) - 1)
-        for i in range(1, len(nodelist)):
-            n1: Node = nodelist[i-1]
-            n2: Node = nodelist[i]
+    def k_shortest_paths(self, n1: Node, n2: Node, k: int, cost_model: str = "hops", priority: int = None) -> List[List[Link]]:
+        """
+        Up to k loopless paths from n1 to n2, cheapest first (Yen's algorithm, see lib.paths);
+        the first one is shortest_path(n1, n2, cost_model, priority). Do not modify the returned lists, they are cached in path_cache.
+        """
+        return self._cached_paths("k_shortest", n1, n2, k, cost_model, priority)
 
-            link = None
-            for l in n1.neighs:
-                if l.n2 == n2:
-                    link = l
-                    break
-            if link == None: raise ValueError("link '%s-%s' not found" % (n1.name, n2.name))
-            linklist[i-1] = link
+    def disjoint_paths(self, n1: Node, n2: Node, k: int = 2, node_disjoint: bool = False, cost_model: str = "hops", priority: int = None) -> List[List[Link]]:
+        """
+        Up to k link disjoint (node_disjoint: node disjoint) paths from n1 to n2 with the lowest total cost,
+        e.g. for redundant transmission (FRER); Suurballe's algorithm, see lib.paths.
+        Do not modify the returned lists, they are cached in path_cache.
+        """
+        return self._cached_paths("node_disjoint" if node_disjoint else "link_disjoint", n1, n2, k, cost_model, priority)
+
+    def _cached_paths(self, kind: str, n1: Node, n2: Node, k: int, cost_model: str, priority: Optional[int]) -> List[List[Link]]:
+        router = self.router(cost_model, priority)
+        if cost_model in ("hops", "inverse_bandwidth"):
+            priority = None
+        source, target = self._node_index(n1), self._node_index(n2)
+        key = (cost_model, priority, kind, source, target, k)
+        cached = self.path_cache.get(key)
+        if cached is None:
+            if kind == "k_shortest":
+                link_ids = paths.k_shortest_paths(self.core, source, target, k, router.costs)
+            else:
+                link_ids = paths.disjoint_paths(self.core, source, target, k, kind == "node_disjoint", router.costs)
+            cached = [[self._links[i] for i in p] for p in link_ids]
+            self.path_cache[key] = cached
+        return cached
 
-        return linklist
+    def nodes_to_links(self, nodelist: List[Node]) -> List[Link]:
+        return [self.get_link(nodelist[i-1], nodelist[i]) for i in range(1, len(nodelist))]
 
     def get_other_devices_within_distance(self, start_node: Node, min_dist: int, max_dist: int) -> List[Node]:
-        devices = []
-        seen = set()
-        q = Queue()
-
-        q.put((start_node, 0))  # origin, distance
-
-        while not q.empty():
-            origin, inbound_dist = q.get()
-            if inbound_dist < max_dist:
-                for link in origin.neighs:
-                    neigh = link.get_other(origin)
-                    if neigh != start_node and neigh not in seen:
-                        seen.add(neigh)
-                        if inbound_dist + 1 >= min_dist:
-                            devices.append(neigh)
-                        q.put((neigh, inbound_dist + 1))
-        return devices
+        node_ids = self.core.nodes_within_distance(self._node_index(start_node), min_dist, max_dist)
+        return [self.nodes[i] for i in node_ids]
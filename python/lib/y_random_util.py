@@ -1,5 +1,8 @@
 import math
 import random
+from abc import ABC, abstractmethod
+
+import numpy as np
 
 
 def unpack_random(varrange):
@@ -19,6 +22,110 @@ def unpack_random(varrange):
     return varrange
 
 
+def unpack_random_batch(varrange, size: int, rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Vectorized version of unpack_random(), draws `size` values at once.
+
+    If no rng is given, it is seeded from the global `random` state, so random.seed() keeps results reproducible.
+    """
+    if rng is None:
+        rng = default_rng()
+    return compile_random(varrange).sample(rng, size)
+
+
+def default_rng() -> np.random.Generator:
+    return np.random.default_rng(random.getrandbits(64))
+
+
+def compile_random(varrange):
+    """
+    Parses a range specification (see unpack_random) once.
+
+    The returned sampler draws single values via sampler() (like unpack_random) or arrays via sampler.sample(rng, size).
+    """
+    if isinstance(varrange, RandomRange):
+        return varrange
+
+    if type(varrange) in (tuple, list):
+        if len(varrange) < 2 or len(varrange) > 3:
+            raise ValueError("range can either be a number, or a list [min, max], or a list [min, max, 'log']")
+        elif len(varrange) == 3 and varrange[2] == "log":
+            return LogRange(varrange[0], varrange[1])
+        elif len(varrange) == 3:
+            raise ValueError("range[2] can only be 'log' for logarithmically scaled random choice")
+        else:
+            return IntRange(varrange[0], varrange[1])
+
+    if type(varrange) == set:
+        return SetRange(varrange)
+
+    return ConstantRange(varrange)
+
+
+class RandomRange(ABC):
+    @abstractmethod
+    def __call__(self):
+        """
+        draws a single value
+        """
+
+    @abstractmethod
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """
+        draws `size` values at once
+        """
+
+
+class ConstantRange(RandomRange):
+    def __init__(self, value) -> None:
+        self.value = value
+
+    def __call__(self):
+        return self.value
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        return np.full(size, self.value)
+
+
+class IntRange(RandomRange):
+    def __init__(self, min: int, max: int) -> None:
+        self.min = min
+        self.max = max
+
+    def __call__(self) -> int:
+        return urandom_int_between(self.min, self.max)
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        return rng.integers(self.min, self.max, size=size, endpoint=True)
+
+
+class LogRange(RandomRange):
+    def __init__(self, min: float, max: float) -> None:
+        self.min = min
+        self.max = max
+        self._log_min = math.log(min)
+        self._log_max = math.log(max)
+
+    def __call__(self) -> float:
+        return math.exp(urandom_float_between(self._log_min, self._log_max))
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        return np.exp(rng.uniform(self._log_min, self._log_max, size=size))
+
+
+class SetRange(RandomRange):
+    def __init__(self, values: set) -> None:
+        self.values = list(values)
+        # sorted, so that array sampling does not depend on the set's iteration order
+        self._sorted = np.array(sorted(self.values))
+
+    def __call__(self):
+        return random.sample(self.values, 1)[0]
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        return self._sorted[rng.integers(0, len(self._sorted), size=size)]
+
+
 def urandom_int_between(min: int, max: int) -> int:
     return random.choice(range(min, max+1))
 
@@ -0,0 +1,74 @@
+from typing import Sequence
+
+import numpy as np
+
+from lib.topology import Topology
+
+
+class StreamAdmission(object):
+    """
+    Residual rate and burst budgets per link and priority, for admitting generated streams only while the
+    topology stays below a utilization target.
+
+    The rate budget of a link is utilization_target times max_bandwidths[link][priority] if the topology defines
+    max_bandwidths, otherwise utilization_target times the link bandwidth, shared by all priorities.
+    The burst budget is utilization_target times max_queue_sizes[link][priority] (in bit, like the stream burst),
+    it is only checked if the topology defines max_queue_sizes.
+    Streams already added to the topology are subtracted from the budgets.
+
+    Share one instance between several create_streams_for_topology() calls that generate streams for the same topology.
+    """
+
+    def __init__(self, topo: Topology, utilization_target: float = 1.0) -> None:
+        self.utilization_target = utilization_target
+        links = topo.links
+        core = topo.core
+        rates = topo.link_rates
+        bursts = topo.link_bursts
+
+        if topo.max_bandwidths:
+            self.per_priority = True
+            self.rate_residual = utilization_target * per_link_and_priority(topo.max_bandwidths, links) - rates
+        else:
+            self.per_priority = False
+            self.rate_residual = (utilization_target * core.bandwidths - rates.sum(axis=1))[:, np.newaxis]
+
+        if topo.max_queue_sizes:
+            self.burst_residual = utilization_target * per_link_and_priority(topo.max_queue_sizes, links) - bursts
+        else:
+            self.burst_residual = None
+
+    def fits(self, link_ids: Sequence[int], priority: int, rate: float, burst: int) -> bool:
+        """
+        True if a stream with these parameters fits on all links of the path
+        """
+        link_ids = np.asarray(link_ids, dtype=np.int64)
+        if not np.all(self.rate_residual[link_ids, priority if self.per_priority else 0] >= rate):
+            return False
+        if self.burst_residual is not None and not np.all(self.burst_residual[link_ids, priority] >= burst):
+            return False
+        return True
+
+    def admit(self, link_ids: Sequence[int], priority: int, rate: float, burst: int) -> bool:
+        """
+        Reserves the budgets for the stream and returns True if it fits(), otherwise returns False and reserves nothing
+        """
+        if not self.fits(link_ids, priority, rate, burst):
+            return False
+        link_ids = np.asarray(link_ids, dtype=np.int64)
+        # a path never uses a link twice, so fancy indexed subtraction is exact
+        self.rate_residual[link_ids, priority if self.per_priority else 0] -= rate
+        if self.burst_residual is not None:
+            self.burst_residual[link_ids, priority] -= burst
+        return True
+
+
+def per_link_and_priority(values: dict, links: Sequence) -> np.ndarray:
+    """
+    {link -> (v0, ..., v7)} as array (link.index x priority); links without values get no limit (inf)
+    """
+    array = np.full((len(links), 8), np.inf)
+    for link, t in values.items():
+        if 0 <= link.index < len(links):
+            array[link.index, :len(t)] = t
+    return array
@@ -1,90 +1,166 @@
 import random
 from typing import Union, Tuple, List, Set
 
+import numpy as np
+
+from lib.instrumentation import timed, count
+from lib.paths import CostRouter
 from lib.stream import Stream
+from lib.stream_table import StreamTable
 from lib.topology import Topology
-from lib.y_random_util import urandom_float_between, unpack_random
+from lib.y_random_util import urandom_float_between, compile_random, default_rng
+from stream_factory.admission import StreamAdmission
+from stream_factory.endpoint_pairs import EndpointPairIndex
 
 MyRangeType = Union[int, float, List, Tuple, Set]
 
 
-def create_streams_for_topology(topo: Topology, num_streams: int, burst_range: MyRangeType, rate_range: MyRangeType, prio_range: MyRangeType, min_pathlen: int = 1, max_pathlen: int = None, only_switch_controller_paths: bool = False) -> List[Stream]:
-    counter = len(topo.get_all_streams())
+@timed("create_streams")
+def create_streams_for_topology(topo: Topology, num_streams: int, burst_range: MyRangeType, rate_range: MyRangeType, prio_range: MyRangeType, min_pathlen: int = 1, max_pathlen: int = None, only_switch_controller_paths: bool = False, rng: np.random.Generator = None, as_table: bool = False, admission: StreamAdmission = None, utilization_target: float = None, max_attempts: int = 10, alternative_paths: int = 0, cost_model: str = "hops") -> Union[List[Stream], StreamTable]:
+    """
+    :param rng: generator for the stream parameters (burst, rate, priority); seeded from `random` if not given
+    :param as_table: return a StreamTable instead of Stream objects, for very large numbers of streams
+    :param admission: only emit streams that fit into its residual budgets, see StreamAdmission;
+                      pass the same instance to all calls for one topology
+    :param utilization_target: shortcut for admission=StreamAdmission(topo, utilization_target)
+    :param max_attempts: with admission, endpoints drawn per stream before it is rejected
+    :param alternative_paths: attach up to this many next shortest paths to every stream (Stream.alternativePaths),
+                              see Topology.k_shortest_paths()
+    :param cost_model: route the streams along the cheapest paths under these link costs (per stream priority),
+                       see Topology.link_costs(); with "residual", the streams added to topo before and the ones placed
+                       earlier in this call count as load. Streams without a path of finite cost are rejected
+    """
+    if admission == None and utilization_target != None:
+        admission = StreamAdmission(topo, utilization_target)
+
+    counter = topo.num_streams
     streams = []
-    printed_warnings = 0
 
-    for i in range(num_streams):
-        n1 = None
-        n2 = None
+    if only_switch_controller_paths:
+        sources = topo.controllers
+        targets = topo.sensors
+
+        if len(sources) == 0 or len(targets) == 0:
+            raise ValueError(f"No controllers or no sensors found in the topology; {len(sources)=}, {len(targets)=}")
+    else:
+        sources = targets = topo.hosts
+
+    # Endpoint pairs within the requested distance; the index is shared by all calls on the same topology
+    window = None
+    if min_pathlen > 1 or max_pathlen != None:
+        if max_pathlen == None: max_pathlen = len(topo.nodes)
+        index = EndpointPairIndex.of(topo, sources, targets, "controller-sensor" if only_switch_controller_paths else "hosts")
+        window = index.window(min_pathlen, max_pathlen)
+
+        if window.empty:
+            print(f"  Warning: no suitable pairs with {min_pathlen=}, {max_pathlen=}, skipping {num_streams} streams")
+            count("dropped_streams", num_streams)
+            return StreamTable.from_streams(topo.links, []) if as_table else streams
+
+    count("streams", num_streams)
+
+    # Draw all stream parameters at once
+    if rng == None: rng = default_rng()
+    bursts = compile_random(burst_range).sample(rng, num_streams)
+    rates = compile_random(rate_range).sample(rng, num_streams).tolist()
+    prios = compile_random(prio_range).sample(rng, num_streams).tolist()
+    max_frame_sizes = np.minimum(bursts - 20*8, 1500*8).tolist()
+    bursts = bursts.tolist()
+
+    labels = []
+    paths = []
+    alternatives = []
+    rows = []
+
+    # with "residual", the rates of the streams placed so far, and routers for the resulting costs (per priority)
+    pending_rates = np.zeros_like(topo.link_rates) if cost_model == "residual" else None
+    pending_routers = {}
+
+    def route(n1, n2, priority):
+        if cost_model == "hops":
+            return topo.core.path_link_ids(n1.index, n2.index)
+        if pending_rates is None or len(rows) == 0:
+            return topo.router(cost_model, priority).path_link_ids(n1.index, n2.index)
+        router = pending_routers.get(priority)
+        if router is None:
+            router = pending_routers[priority] = CostRouter(topo.core, topo.link_costs(cost_model, priority, pending_rates))
+        return router.path_link_ids(n1.index, n2.index)
+
+    def endpoints():
+        if window != None:
+            n1, n2 = window.sample()
+        elif only_switch_controller_paths:
+            n1, = random.sample(sources, 1)
+            n2, = random.sample(targets, 1)
+        else:
+            n1, n2 = random.sample(sources, 2)
 
         if only_switch_controller_paths:
-            controllers = topo.controllers
-            sensors = topo.sensors
-
-            if len(controllers) == 0 or len(sensors) == 0:
-                raise ValueError(f"No controllers or no sensors found in the topology; {len(controllers)=}, {len(sensors)=}")
-
-            if min_pathlen <= 1 and max_pathlen == None:
-                n1, = random.sample(controllers, 1)
-                n2, = random.sample(sensors, 1)
-            else:
-                if max_pathlen == None: max_pathlen = len(topo.nodes)
-                n1, = random.sample(controllers, 1)
-                n2_choices = []
-                for j in range(100):
-                    if len(n2_choices) > 0: break
-                    n1, = random.sample(controllers, 1)
-                    n2_choices = [n for n in topo.get_other_devices_within_distance(n1, min_pathlen, max_pathlen) if n.type == "sensor"]
-
-                if len(n2_choices) == 0:
-                    printed_warnings += 1
-                    if printed_warnings == 5:
-                        print(f"  Further warnings suppressed...")
-                    elif printed_warnings < 5:
-                        print(f"  Warning: no suitable pairs with {min_pathlen=}, {max_pathlen=}")
-                else:
-                    n2, = random.sample(n2_choices, 1)
-
             # Flip a coin to select "controller->sensor" or "sensor->controller" direction
             if urandom_float_between(0, 1) <= 0.5:
                 n1, n2 = n2, n1
+        return n1, n2
 
+    for i in range(num_streams):
+        if admission == None:
+            n1, n2 = endpoints()
+            path_ids = route(n1, n2, prios[i]) if as_table or cost_model != "hops" else None
+            if path_ids == None and cost_model != "hops":
+                # every path uses a link the cost model excludes (e.g. a full link with "residual")
+                count("rejected_streams")
+                continue
         else:
-            devices = topo.hosts
-
-            if min_pathlen <= 1 and max_pathlen == None:
-                n1, n2 = random.sample(devices, 2)
+            # resample the endpoints until the stream fits, or reject it
+            for attempt in range(max_attempts):
+                n1, n2 = endpoints()
+                path_ids = route(n1, n2, prios[i])
+                if path_ids != None and admission.admit(path_ids, prios[i], rates[i], bursts[i]):
+                    break
             else:
-                if max_pathlen == None: max_pathlen = len(topo.nodes)
-                n1, = random.sample(devices, 1)
-                n2_choices = []
-                for j in range(100):
-                    if len(n2_choices) > 0: break
-                    n1, = random.sample(devices, 1)
-                    n2_choices = [n for n in topo.get_other_devices_within_distance(n1, min_pathlen, max_pathlen) if n.is_host]
-
-                if len(n2_choices) == 0:
-                    printed_warnings += 1
-                    if printed_warnings == 5:
-                        print(f"  Further warnings suppressed...")
-                    elif printed_warnings < 5:
-                        print(f"  Warning: no suitable pairs with {min_pathlen=}, {max_pathlen=}")
-                else:
-                    n2, = random.sample(n2_choices, 1)
-
-        if n2:
-            burst = unpack_random(burst_range)
-            rate = unpack_random(rate_range)
-            prio = unpack_random(prio_range)
-
-            stream = Stream(label = f"st{counter+i}",
-                            path = topo.shortest_path(n1, n2),
-                            priority = prio,
-                            rate = rate,
-                            burst = burst,
-                            minFrameSize = 64*8,
-                            maxFrameSize = min(burst-20*8, 1500*8))
-            streams.append(stream)
+                count("rejected_streams")
+                continue
+            count("admission_attempts", attempt + 1)
+
+        label = f"st{counter + len(rows)}"
+        rows.append(i)
+        if pending_rates is not None:
+            pending_rates[path_ids, prios[i]] += rates[i]
+            pending_routers.clear()
+        if as_table:
+            labels.append(label)
+            paths.append(path_ids)
+            alternatives.append([[l.index for l in p] for p in topo.k_shortest_paths(n1, n2, alternative_paths + 1, cost_model, prios[i])[1:]] if alternative_paths > 0 else [])
+            continue
+
+        stream = Stream(label = label,
+                        path = topo.shortest_path(n1, n2) if path_ids == None else [topo.links[l] for l in path_ids],
+                        priority = prios[i],
+                        rate = rates[i],
+                        burst = bursts[i],
+                        minFrameSize = 64*8,
+                        maxFrameSize = max_frame_sizes[i],
+                        alternativePaths = topo.k_shortest_paths(n1, n2, alternative_paths + 1, cost_model, prios[i])[1:] if alternative_paths > 0 else None)
+        streams.append(stream)
+
+    if as_table:
+        path_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in paths], out=path_offsets[1:])
+        alt_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(a) for a in alternatives], out=alt_offsets[1:])
+        alt_paths = [p for a in alternatives for p in a]
+        alt_path_offsets = np.zeros(len(alt_paths) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in alt_paths], out=alt_path_offsets[1:])
+        return StreamTable(topo.links,
+                           labels = labels,
+                           path_offsets = path_offsets,
+                           path_links = np.fromiter((l for p in paths for l in p), dtype=np.int32, count=int(path_offsets[-1])),
+                           priority = [prios[i] for i in rows],
+                           rate = [rates[i] for i in rows],
+                           burst = [bursts[i] for i in rows],
+                           minFrameSize = np.full(len(rows), 64*8),
+                           maxFrameSize = [max_frame_sizes[i] for i in rows],
+                           alt_offsets = alt_offsets,
+                           alt_path_offsets = alt_path_offsets,
+                           alt_path_links = np.fromiter((l for p in alt_paths for l in p), dtype=np.int32, count=int(alt_path_offsets[-1])))
 
     return streams
-
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import random
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from lib.compact_graph import TREE_CACHE_NODES
+from lib.topology import Topology, Node
+
+
+class EndpointPairIndex(object):
+    """
+    The (source, target) endpoint pairs of a topology by hop distance, built lazily per source.
+
+    The row of a source lists all targets sorted by their distance (taken from the BFS tree of the source),
+    so the targets within any distance window are a contiguous slice of that row.
+    Rows are only built for sampled sources and cached within the TREE_CACHE_NODES budget (the oldest are dropped first).
+    Use EndpointPairIndex.of() to share one index between all stream factory calls on the same (unmodified) topology.
+    """
+
+    UNREACHABLE = np.iinfo(np.int32).max
+
+    def __init__(self, topo: Topology, sources: List[Node], targets: List[Node]) -> None:
+        self.sources = list(sources)
+        self.targets = list(targets)
+
+        self._core = topo.core
+        self._dst_ids = np.fromiter((n.index for n in self.targets), dtype=np.int64, count=len(self.targets))
+        self._rows: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._max_rows = max(1, TREE_CACHE_NODES // max(1, len(self.targets)))
+        self._windows: Dict[Tuple[int, int], EndpointPairWindow] = {}
+
+    @staticmethod
+    def of(topo: Topology, sources: List[Node], targets: List[Node], key: str) -> EndpointPairIndex:
+        """
+        returns the cached index for `key` or builds it; the cache is dropped whenever the topology changes
+        """
+        index = topo.core.derived.get(f"endpoint_pairs/{key}")
+        if index is None:
+            index = EndpointPairIndex(topo, sources, targets)
+            topo.core.derived[f"endpoint_pairs/{key}"] = index
+        return index
+
+    def row(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        returns (order, sorted_dist) of source i: the target positions sorted by distance, and their distances
+        (UNREACHABLE for unreachable targets and for the source itself)
+        """
+        row = self._rows.get(i)
+        if row is None:
+            src_id = self.sources[i].index
+            dist = self._core.source_tree(src_id)[0][self._dst_ids]
+            dist[dist < 0] = EndpointPairIndex.UNREACHABLE
+            dist[self._dst_ids == src_id] = EndpointPairIndex.UNREACHABLE
+
+            order = np.argsort(dist, kind="stable").astype(np.int32)
+            row = (order, dist[order])
+            if len(self._rows) >= self._max_rows:
+                del self._rows[next(iter(self._rows))]
+            self._rows[i] = row
+        return row
+
+    def window(self, min_dist: int, max_dist: int) -> EndpointPairWindow:
+        window = self._windows.get((min_dist, max_dist))
+        if window is None:
+            window = EndpointPairWindow(self, min_dist, max_dist)
+            self._windows[(min_dist, max_dist)] = window
+        return window
+
+
+class EndpointPairWindow(object):
+    """
+    The endpoint pairs with min_dist <= hop distance <= max_dist.
+
+    Sampling picks a source uniformly among the sources with at least one target in the window,
+    then a target uniformly among its targets in the window.
+    Sources are checked when they are drawn; the ones without targets in the window are dropped and redrawn.
+    """
+
+    def __init__(self, index: EndpointPairIndex, min_dist: int, max_dist: int) -> None:
+        self._index = index
+        self._min_dist = min_dist
+        self._max_dist = max_dist
+        self._candidates = list(range(len(index.sources)))
+        """
+        sources not (yet) known to have no targets in the window
+        """
+        self._slices: Dict[int, Tuple[int, int]] = {}
+        """
+        source -> (first position, number of targets) of its targets in the window, within its row
+        """
+
+    def _slice(self, i: int) -> Tuple[int, int]:
+        s = self._slices.get(i)
+        if s is None:
+            sorted_dist = self._index.row(i)[1]
+            lo = int(np.searchsorted(sorted_dist, self._min_dist, side="left"))
+            hi = int(np.searchsorted(sorted_dist, self._max_dist, side="right"))
+            s = self._slices[i] = (lo, hi - lo)
+        return s
+
+    def _drop_candidate(self, k: int) -> None:
+        self._candidates[k] = self._candidates[-1]
+        self._candidates.pop()
+
+    @property
+    def empty(self) -> bool:
+        # checks the candidates in order until one has a target, without consuming random numbers
+        while len(self._candidates) > 0:
+            if self._slice(self._candidates[0])[1] > 0:
+                return False
+            self._drop_candidate(0)
+        return True
+
+    def sample(self) -> Tuple[Node, Node]:
+        while len(self._candidates) > 0:
+            k = random.randrange(len(self._candidates))
+            i = self._candidates[k]
+            lo, num = self._slice(i)
+            if num == 0:
+                self._drop_candidate(k)
+                continue
+            col = self._index.row(i)[0][lo + random.randrange(num)]
+            return self._index.sources[i], self._index.targets[col]
+        raise ValueError("no endpoint pairs within this distance window")
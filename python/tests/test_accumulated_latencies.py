@@ -0,0 +1,102 @@
+import random
+
+import numpy as np
+import pytest
+
+from lib.stream import Stream
+from lib.stream_table import segmented_exclusive_cumsum
+from lib.topology import Link, Node
+from stream_factory.create_streams import create_streams_for_topology
+from topology_factory.linear_branches import linear_branches
+
+GUARANTEES = (1.1e-3, 7e-4, 3.3e-4, 1e-3, 4.7e-4, 2.1e-4, 1.3e-4, 5.3e-5)
+
+
+def scalar_acc_latencies(topo, stream):
+    """
+    accumulated latencies of every hop, one stream at a time like the original per-stream implementation
+    """
+    acc_max = np.insert(np.cumsum([topo.max_delays[link][stream.priority] for link in stream.path]), 0, 0)
+    acc_min = np.insert(np.cumsum([stream.minFrameSize / (link.bandwidth / 1e9) for link in stream.path]), 0, 0)
+    return acc_max[:-1].tolist(), acc_min[:-1].tolist()
+
+
+def build(as_table):
+    random.seed(3)
+    Stream.LAST_ID = -1
+    topo = linear_branches(main_length=8, branches_per_main_switch=2, branch_length=3, hosts_per_branch_switch=3,
+                           main_link_speed=1e10, branch_link_speed=1e9, connect_to_ring=True)
+    topo.update_guarantees_all_links(GUARANTEES)
+    topo.add_streams(create_streams_for_topology(topo, num_streams=3000, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"],
+                                                 prio_range=[0, 7], as_table=as_table))
+    return topo
+
+
+def assert_exact(topo):
+    for stream in topo.get_all_streams():
+        acc_max, acc_min = scalar_acc_latencies(topo, stream)
+        assert [ls.accMaxLatency for ls in stream.localStreams] == acc_max
+        assert [ls.accMinLatency for ls in stream.localStreams] == acc_min
+
+
+def test_streams_match_scalar_path_exactly():
+    assert_exact(build(as_table=False))
+
+
+def test_table_matches_scalar_path_exactly():
+    assert_exact(build(as_table=True))
+
+
+def test_partial_update_matches_scalar_path_exactly():
+    topo = build(as_table=False)
+    links = list(topo.links)
+    topo.update_guarantees_dict({links[0]: (3.7e-4,) * 8, links[5]: (9.1e-4,) * 8})
+    assert_exact(topo)
+
+
+def test_segmented_exclusive_cumsum():
+    values = np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6])
+    offsets = np.array([0, 3, 4, 6])
+    assert segmented_exclusive_cumsum(values, offsets).tolist() == [0.0, 0.1, 0.1 + 0.2, 0.0, 0.0, 0.5]
+    assert segmented_exclusive_cumsum(np.zeros(0), np.array([0])).tolist() == []
+
+
+def test_guarantees_of_foreign_links_are_rejected():
+    topo = build(as_table=False)
+    other = build(as_table=False).reset_with_prefix("other_")
+    before = [(ls.accMaxLatency, ls.accMinLatency) for st in topo.get_all_streams_sorted() for ls in st.localStreams]
+    links = list(topo.links)
+
+    for foreign in (other.links[0], Link(Node("x", "switch"), Node("y", "switch"), 1e9, 0, 0)):
+        with pytest.raises(KeyError):
+            topo.update_guarantees_dict({links[3]: (9.9e-4,) * 8, foreign: (3.7e-4,) * 8})
+    assert [(ls.accMaxLatency, ls.accMinLatency) for st in topo.get_all_streams_sorted() for ls in st.localStreams] == before
+    assert topo.max_delays[links[-1]] == GUARANTEES
+
+    # an equal copy of one of its own links is fine, e.g. from Link.mirror()
+    topo.update_guarantees_dict({links[4].mirror(): (3.7e-4,) * 8})
+    assert topo.max_delays[links[4].mirror()] == (3.7e-4,) * 8
+    assert_exact(topo)
+
+
+def test_streams_over_foreign_links_are_rejected():
+    topo = build(as_table=False)
+    other = build(as_table=False).reset_with_prefix("other_")
+    other.update_idle_slopes_all_links((1e8,) * 8)
+    topo.update_idle_slopes_all_links((1e8,) * 8)
+    loads = topo.link_rates.copy()
+
+    stream = Stream("foreign", [other.links[0]], 0, 1e6, 2000, 512, 1000)
+    with pytest.raises(ValueError):
+        topo.add_stream(stream)
+    with pytest.raises(ValueError):
+        topo.add_streams(create_streams_for_topology(other, num_streams=5, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 1e6], prio_range=[0, 7], as_table=True))
+    with pytest.raises(ValueError):
+        topo.update_idle_slopes_bulk([stream])
+    assert np.array_equal(topo.link_rates, loads)
+    assert topo.num_streams == 3000
+
+    topo.max_bandwidths[Link(Node("x", "switch"), Node("y", "switch"), 1e9, 0, 0)] = (1e8,) * 8
+    topo.max_bandwidths = dict(topo.max_bandwidths)
+    with pytest.raises(KeyError):
+        topo.update_idle_slopes_bulk(topo.get_all_streams_sorted()[:1])
@@ -0,0 +1,66 @@
+import pickle
+import random
+
+import numpy as np
+
+from import_export.json import from_json, to_json
+from import_export.npy import NpyScenario, from_npy, to_npy
+from lib.stream import Stream
+from lib.stream_table import StreamTable
+from stream_factory.create_streams import create_streams_for_topology
+from topology_factory.linear_branches import linear_branches
+
+
+def build(as_table):
+    random.seed(5)
+    Stream.LAST_ID = -1
+    topo = linear_branches(main_length=6, branches_per_main_switch=2, branch_length=2, hosts_per_branch_switch=2,
+                           main_link_speed=1e10, branch_link_speed=1e9, connect_to_ring=True)
+    topo.add_streams(create_streams_for_topology(topo, num_streams=200, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 5e6, "log"],
+                                                 prio_range=[0, 7], as_table=as_table, alternative_paths=2))
+    return topo
+
+
+def stream_dicts(topo):
+    return [st.to_json_dict() for st in topo.get_all_streams_sorted()]
+
+
+def test_streams_have_alternatives():
+    dicts = stream_dicts(build(as_table=False))
+    assert sum(len(d.get("alternativePaths", ())) for d in dicts) > 100
+
+
+def test_table_matches_objects():
+    assert stream_dicts(build(as_table=True)) == stream_dicts(build(as_table=False))
+
+
+def test_from_streams_round_trip():
+    topo = build(as_table=False)
+    streams = topo.get_all_streams_sorted()
+    table = StreamTable.from_streams(topo.links, streams)
+    assert [st.to_json_dict() for st in table] == [st.to_json_dict() for st in streams]
+    assert [st.to_json_dict() for st in table.to_streams()] == [st.to_json_dict() for st in streams]
+
+
+def test_pickle_round_trip():
+    topo = build(as_table=False)
+    assert stream_dicts(pickle.loads(pickle.dumps(topo))) == stream_dicts(topo)
+
+
+def test_json_round_trip(tmp_path):
+    topo = build(as_table=False)
+    to_json(topo, str(tmp_path / "scenario.json"))
+    for as_table in (False, True):
+        assert stream_dicts(from_json(str(tmp_path / "scenario.json"), as_table=as_table)) == stream_dicts(topo)
+
+
+def test_npy_round_trip(tmp_path):
+    topo = build(as_table=False)
+    to_npy(topo, str(tmp_path))
+    expected = stream_dicts(topo)
+    assert NpyScenario(str(tmp_path)).to_json_dict()["streams"] == expected
+    for as_table in (False, True):
+        assert stream_dicts(from_npy(str(tmp_path), as_table=as_table)) == expected
+
+    rows = np.array([3, 0, 17, 150])
+    assert stream_dicts(from_npy(str(tmp_path), rows)) == sorted((expected[r] for r in rows), key=lambda d: d["id"])
@@ -0,0 +1,46 @@
+import json
+import random
+
+from import_export.json import from_json, to_json
+from lib.stream import Stream
+from stream_factory.create_streams import create_streams_for_topology
+from topology_factory.linear_branches import linear_branches
+
+
+def build():
+    """
+    a topology with regular streams and the rows of two tables (one of them partially removed)
+    """
+    random.seed(7)
+    Stream.LAST_ID = -1
+    topo = linear_branches(main_length=5, branches_per_main_switch=2, branch_length=2, hosts_per_branch_switch=2,
+                           main_link_speed=1e10, branch_link_speed=1e9, connect_to_ring=True)
+    params = dict(burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 1e6], prio_range=[0, 7])
+    tables = [create_streams_for_topology(topo, num_streams=50, as_table=True, alternative_paths=1, **params) for _ in range(2)]
+    topo.add_streams(tables[1])
+    topo.add_streams(create_streams_for_topology(topo, num_streams=50, **params))
+    topo.add_streams(tables[0])
+    topo.remove_stream(tables[0][10])
+    return topo, tables
+
+
+def test_export_matches_streams(tmp_path):
+    topo, tables = build()
+    expected = [st.to_json_dict() for st in topo.get_all_streams_sorted()]
+    assert list(topo.stream_json_dicts_sorted()) == expected
+
+    to_json(topo, str(tmp_path / "scenario.json"))
+    with open(tmp_path / "scenario.json") as f:
+        assert json.load(f)["streams"] == expected
+    assert [st.to_json_dict() for st in from_json(str(tmp_path / "scenario.json")).get_all_streams_sorted()] == expected
+
+
+def test_export_keeps_no_views(tmp_path):
+    topo, tables = build()
+    to_json(topo, str(tmp_path / "scenario.json"))
+    assert [len(table._views) for table in tables] == [0, 0]
+
+    view = tables[1][3]
+    assert tables[1][3] is view
+    del view
+    assert len(tables[1]._views) == 0
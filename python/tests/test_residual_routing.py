@@ -0,0 +1,42 @@
+import random
+
+from lib.stream import Stream
+from lib.topology import Topology, Host, Switch
+from stream_factory.create_streams import create_streams_for_topology
+
+
+def diamond():
+    """
+    h1 - s1 - (s2 | s3) - s4 - h2: two paths of equal length between the hosts
+    """
+    topo = Topology()
+    h1, s1, s2, s3, s4, h2 = (topo.add_node(n) for n in (Host("h1"), Switch("s1"), Switch("s2"), Switch("s3"), Switch("s4"), Host("h2")))
+    for n1, n2 in ((h1, s1), (s1, s2), (s1, s3), (s2, s4), (s3, s4), (s4, h2)):
+        topo.create_and_add_links(n1, n2, 1e9)
+    return topo
+
+
+def middle_switches(streams):
+    """
+    (source, middle switch) of every stream
+    """
+    return [(st.path[0].n1.name, st.path[1].n2.name) for st in streams]
+
+
+def test_residual_spreads_one_batch():
+    random.seed(1)
+    Stream.LAST_ID = -1
+    topo = diamond()
+    streams = create_streams_for_topology(topo, num_streams=20, burst_range=8000, rate_range=1e7, prio_range=0, cost_model="residual")
+    assert len(streams) == 20
+
+    used = middle_switches(streams)
+    for source in ("h1", "h2"):
+        # equal rates: the two paths take turns
+        middles = [m for s, m in used if s == source]
+        assert len(middles) >= 2
+        assert all(a != b for a, b in zip(middles, middles[1:]))
+
+    topo.add_streams(streams)
+    load = {l.name: rate for l, rate in zip(topo.links, topo.link_rates[:, 0])}
+    assert abs(load["s1-s2"] - load["s1-s3"]) <= 1e7
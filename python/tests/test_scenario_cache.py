@@ -0,0 +1,63 @@
+import math
+import pickle
+
+from factory_profiles.scenario_cache import ScenarioCache
+from lib.stream import Stream
+from lib.topology import Topology
+from stream_factory.create_streams import create_streams_for_topology
+from topology_factory.linear_branches import linear_branches
+
+
+def stream_state(topo):
+    """
+    type, json and per hop values of all streams, and the links that carry regular Stream objects
+    """
+    streams = [(type(st).__name__, st.to_json_dict(),
+                [(ls.accMaxLatency, ls.accMinLatency, ls.accMinLatencyCQF, ls.accMaxLatencyCQF, ls.maxIdleSlope) for ls in st.localStreams])
+               for st in topo.get_all_streams_sorted()]
+    return streams, sorted(l.name for l in topo.streams_per_link)
+
+
+def test_hit_matches_miss(tmp_path):
+    miss = ScenarioCache(str(tmp_path)).generate("automotive", seed=4)
+    hit = ScenarioCache(str(tmp_path)).generate("automotive", seed=4)
+    assert hit is not miss
+    assert len(miss.streams_per_link) > 0
+    assert stream_state(hit) == stream_state(miss)
+
+
+def test_hit_reserves_stream_ids(tmp_path):
+    cache = ScenarioCache(str(tmp_path))
+    cache.generate("automotive", seed=4)
+
+    # a fresh process, where no streams were created yet
+    Stream.LAST_ID = -1
+    topo = cache.generate("automotive", seed=4)
+    num_cached = topo.num_streams
+    topo.add_streams(create_streams_for_topology(topo, num_streams=10, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 1e6], prio_range=[0, 7]))
+    assert topo.num_streams == num_cached + 10
+    assert len(topo.get_all_streams_sorted()) == num_cached + 10
+
+
+def test_pickle_keeps_per_hop_values_and_tables():
+    topo = linear_branches(main_length=4, branches_per_main_switch=1, branch_length=2, hosts_per_branch_switch=2,
+                           main_link_speed=1e10, branch_link_speed=1e9, connect_to_ring=True)
+    topo.update_guarantees_all_links((1e-3,) * 8)
+    topo.update_idle_slopes_all_links((1e8,) * 8)
+    topo.add_streams(create_streams_for_topology(topo, num_streams=30, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 1e6], prio_range=[0, 7]))
+    table = create_streams_for_topology(topo, num_streams=20, burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 1e6], prio_range=[0, 7], as_table=True)
+    topo.add_streams(table)
+    topo.remove_stream(table[3])
+    for i, st in enumerate(topo.get_all_streams_sorted()):
+        for ls in st.localStreams:
+            ls._accMinLatencyCQF = 1e-6 * i
+            ls._accMaxLatencyCQF = 2e-6 * i
+
+    restored = pickle.loads(pickle.dumps(topo))
+    assert restored.num_streams == 49
+    assert stream_state(restored) == stream_state(topo)
+    assert not math.isinf(restored.get_all_streams_sorted()[-1].localStreams[-1].accMaxLatency)
+
+
+def test_pickle_empty_topology():
+    assert stream_state(pickle.loads(pickle.dumps(Topology()))) == ([], [])
@@ -1,10 +1,18 @@
 import random
 from math import inf
+from typing import List
 
+from lib.instrumentation import timed
 from lib.topology import Topology, Node
 
 
-def combine_topologies(topo1: Topology, topo2: Topology, maxJoins: int = inf, add_name_prefixes: bool = True, removeJoinPointsUsed: bool = True, removeJoinPointsTopo1: bool = False, removeJoinPointsTopo2: bool = False) -> Topology:
+@timed()
+def combine_topologies(topo1: Topology, topo2: Topology, maxJoins: int = inf, add_name_prefixes: bool = True, removeJoinPointsUsed: bool = True, removeJoinPointsTopo1: bool = False, removeJoinPointsTopo2: bool = False, in_place: bool = False) -> Topology:
+    """
+    :param in_place: graft a copy of topo2 into topo1 and return topo1, instead of copying both into a new topology;
+                     costs only the size of topo2, e.g. for growing a backbone in a loop.
+                     With add_name_prefixes, only the nodes of topo2 are prefixed (topo1 keeps its names).
+    """
     jps1 = topo1.joinPoints
     jps2 = topo2.joinPoints
     jpsl = min(maxJoins, len(jps1), len(jps2))
@@ -14,12 +22,16 @@ def combine_topologies(topo1: Topology, topo2: Topology, maxJoins: int = inf, ad
 
     # Prevent having the same node name twice
     if add_name_prefixes:
-        prefix1 = "t1_"
+        prefix1 = "" if in_place else "t1_"
         prefix2 = "t2_"
     else:
         prefix1 = ""
         prefix2 = ""
 
+    if in_place:
+        if any(topo1.has_node(f"{prefix2}{n.name}") for n in topo2.nodes):
+            raise ValueError(f"The names of both topologies are not mutually exclusive - consider using `add_name_prefixes`")
+    elif not add_name_prefixes:
         names1 = set(n.name for n in topo1.nodes)
         names2 = set(n.name for n in topo2.nodes)
         names3 = names1.union(names2)
@@ -30,37 +42,43 @@ def combine_topologies(topo1: Topology, topo2: Topology, maxJoins: int = inf, ad
     jpr1 = random.sample(jps1, k=jpsl)
     jpr2 = random.sample(jps2, k=jpsl)
 
-    new_topo = Topology()
-    for n in topo1.nodes:
-        nn = Node(name=f"{prefix1}{n.name}", type=n.type, joinPoint=n.joinPoint)
-        n.nn = nn
-        new_topo.add_node(nn)
-    for n in topo2.nodes:
-        nn = Node(name=f"{prefix2}{n.name}", type=n.type, joinPoint=n.joinPoint)
-        n.nn = nn
-        new_topo.add_node(nn)
-
-    for l in topo1.links:
-        l.n1.nn.addNeigh(l.n2.nn, bw=l.bandwidth)
-    for l in topo2.links:
-        l.n1.nn.addNeigh(l.n2.nn, bw=l.bandwidth)
+    # new nodes by Node.index of the original ones
+    if in_place:
+        new_topo = topo1
+        nodes1 = topo1.nodes
+    else:
+        new_topo = Topology()
+        nodes1 = copy_into(new_topo, topo1, prefix1)
+    nodes2 = copy_into(new_topo, topo2, prefix2)
 
     for jp1, jp2 in zip(jpr1, jpr2):
         maxls1 = max([l.bandwidth for l in jp1.neighs])
         maxls2 = max([l.bandwidth for l in jp2.neighs])
         maxls = max(maxls1, maxls2)
 
-        jp1.nn.addNeigh(jp2.nn, bw=maxls)
+        nodes1[jp1.index].addNeigh(nodes2[jp2.index], bw=maxls)
 
         if removeJoinPointsUsed:
-            jp1.nn.joinPoint = False
-            jp2.nn.joinPoint = False
+            nodes1[jp1.index].joinPoint = False
+            nodes2[jp2.index].joinPoint = False
 
     if removeJoinPointsTopo1:
         for n in jps1:
-            n.nn.joinPoint = False
+            nodes1[n.index].joinPoint = False
     if removeJoinPointsTopo2:
         for n in jps2:
-            n.nn.joinPoint = False
+            nodes2[n.index].joinPoint = False
 
     return new_topo
+
+
+def copy_into(topo: Topology, source: Topology, prefix: str = "") -> List[Node]:
+    """
+    Adds copies of all nodes (with prefixed names) and links of source to topo.
+
+    returns the copies, in the order of source.nodes (i.e. by Node.index)
+    """
+    copies = [topo.add_node(Node(name=f"{prefix}{n.name}", type=n.type, joinPoint=n.joinPoint)) for n in source.nodes]
+    for l in source.links:
+        copies[l.n1.index].addNeigh(copies[l.n2.index], bw=l.bandwidth)
+    return copies
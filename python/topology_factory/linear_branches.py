@@ -1,12 +1,14 @@
 import random
 from typing import Union, List, Tuple, Set
 
+from lib.instrumentation import timed
 from lib.topology import Topology, Switch, Host, Sensor
 from lib.y_random_util import unpack_random as ur
 
 MyRangeType = Union[int, float, List, Tuple, Set]
 
 
+@timed()
 def linear_branches(main_length: MyRangeType, branches_per_main_switch: MyRangeType, branch_length: MyRangeType, hosts_per_branch_switch: MyRangeType, main_link_speed: MyRangeType, branch_link_speed: MyRangeType, connect_to_ring: MyRangeType = False, num_join_points: MyRangeType = 0) -> Topology:
     topo = Topology()
 
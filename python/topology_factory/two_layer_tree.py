@@ -1,11 +1,13 @@
 from typing import Union, List, Tuple, Set
 
+from lib.instrumentation import timed
 from lib.topology import Topology, Switch, Host
 from lib.y_random_util import unpack_random as ur
 
 MyRangeType = Union[int, float, List, Tuple, Set]
 
 
+@timed()
 def two_layer_tree(num_layer1_switches: MyRangeType, num_layer2_switches: MyRangeType, hosts_per_l2switch: MyRangeType, switch_link_speed: MyRangeType, host_link_speed: MyRangeType) -> Topology:
     topo = Topology()
 
@@ -1,77 +1,219 @@
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+
 import networkx as nx
+import numpy as np
 import matplotlib.pyplot as plt
 
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Literal, Iterable, Union
 
 from networkx import Graph
 from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.collections import LineCollection
 
 from lib.topology import Topology, Link
 
 
-def visualize_topology(topo: Topology, color_per_prio_dict: Dict[Link, float], pos: dict = None, filepath = "/tmp/last_topo.pdf", title = "", mincolor = -1, maxcolor = -1):
-    G = topo_to_graph(topo)
+def visualize_topology(topo: Topology, color_per_prio_dict: Union[Dict[Link, float], np.ndarray], pos: dict = None, filepath = "/tmp/last_topo.pdf", title = "", mincolor = -1, maxcolor = -1, scale: Literal["linear", "log"] = "linear"):
+    """
+    :param color_per_prio_dict: value per link (dict, or array indexed by Link.index), colored from green (low) to red (high)
+    :param mincolor: fixed lower color border, see metric_colors()
+    :param maxcolor: fixed upper color border
+    :param scale: "linear" or "log" color normalization
+    """
+    render_pdf([prepare_page(topo, color_per_prio_dict, pos, title, mincolor, maxcolor, scale)], filepath)
+
+
+@dataclass
+class PageData:
+    """
+    Everything needed to draw one page, as plain arrays; cheap to pickle, so pages can be prepared in worker processes.
+    """
+    geometry_key: str
+    """
+    pages with the same key have the same segments, nodes and labels (same topology and positions)
+    """
+    segments: np.ndarray  # edges x 2 x 2
+    edge_colors: np.ndarray  # edges x RGB
+    node_xy: np.ndarray  # nodes x 2
+    node_sizes: List[int]
+    node_colors: List[str]
+    labels: List[Tuple[float, float, str]]
+    title: str
+
+
+def prepare_page(topo: Topology, color_per_prio_dict: Union[Dict[Link, float], np.ndarray], pos: dict = None, title = "", mincolor = -1, maxcolor = -1, scale: Literal["linear", "log"] = "linear") -> PageData:
+    """
+    Same parameters as visualize_topology(); returns the page instead of writing it, see render_pdf().
+    """
     if pos == None:
-        pos = graph_positions(G)
-
-    with PdfPages(filepath) as pdf:
-        mincolor, maxcolor, colors = edge_colors(G, color_per_prio_dict, mincolor, maxcolor)
-
-        options = {
-            "node_size": [
-                60 if n["origin"].type == "switch" else 20
-                for n in G._node.values()
-            ],
-            "node_color": [
-                "#EEEEEE" if n["origin"].type == "switch" else "#3297a8"
-                for n in G._node.values()
-            ],
-            "edgecolors": "#777777",
-            "edge_color": colors,
-            "linewidths": 1,
-            "width": 1,
-            "with_labels": False,
-        }
-
-        nx.draw(G, pos, **options)
-
-        labels = {
-            n.name: "x" if n.joinPoint else ""
-            for n in topo.nodes
-        }
-        nx.draw_networkx_labels(G, pos, labels, font_size = 8, font_color = "#555555")
-
-        plt.title(f"{title}\nmin={convert_bps_to_str(mincolor)}   max={convert_bps_to_str(maxcolor)}")
-        plt.axis("off")
-        pdf.savefig()
-        plt.close()
-
-
-def edge_colors(G: Graph, delays: Dict[Link, float], mincolor = -1, maxcolor = -1) -> Tuple[float, float, List[Tuple]]:
-    # convert for compatibility with Graph
-    # also combine both directions of a link to the same value, for simplicity
-    delays = {l.name: max(t, delays[l.mirror()]) for l, t in delays.items()}
+        pos = layout_positions(topo)
+    mincolor, maxcolor, colors = metric_colors(edge_values(topo, color_per_prio_dict), mincolor, maxcolor, scale)
+
+    nodes = topo.nodes
+    forward, _ = edge_order(topo)
+    core = topo.core
+    node_xy = np.array([pos[n.name] for n in nodes], dtype=float).reshape(-1, 2)
+    segments = np.stack((node_xy[core.src[forward]], node_xy[core.dst[forward]]), axis=1)
+    labels = [(*pos[n.name], "x") for n in nodes if n.joinPoint]
+    geometry_key = hashlib.sha1(segments.tobytes() + node_xy.tobytes() + repr(labels).encode("utf-8")).hexdigest()
+
+    return PageData(geometry_key=geometry_key,
+                    segments=segments,
+                    edge_colors=colors,
+                    node_xy=node_xy,
+                    node_sizes=[60 if n.type == "switch" else 20 for n in nodes],
+                    node_colors=["#EEEEEE" if n.type == "switch" else "#3297a8" for n in nodes],
+                    labels=labels,
+                    title=f"{title}\nmin={convert_bps_to_str(mincolor)}   max={convert_bps_to_str(maxcolor)}")
+
+
+class PdfBatchRenderer(object):
+    """
+    Writes pages into one multi-page PDF with a single figure; the edge and node collections are created once and
+    only updated per page, consecutive pages of the same topology and positions only recolor the edges.
+
+        with PdfBatchRenderer(path) as renderer:
+            for page in pages:
+                renderer.add_page(page)
+    """
+
+    def __init__(self, filepath: str) -> None:
+        self.pdf = PdfPages(filepath)
+        self.fig, self.ax = plt.subplots()
+        self.ax.axis("off")
+        self.edges = LineCollection([], linewidths=1, zorder=1)
+        self.nodes = self.ax.scatter([], [], edgecolors="#777777", linewidths=1, zorder=2)
+        self.ax.add_collection(self.edges)
+        self.texts = []
+        self.geometry_key = None
+        self.pages = 0
+
+    def add_page(self, page: PageData) -> None:
+        if page.geometry_key != self.geometry_key:
+            self.geometry_key = page.geometry_key
+            self.edges.set_segments(page.segments)
+            self.nodes.set_offsets(page.node_xy)
+            self.nodes.set_sizes(page.node_sizes)
+            self.nodes.set_facecolors(page.node_colors)
+            for text in self.texts:
+                text.remove()
+            self.texts = [self.ax.text(x, y, label, fontsize=8, color="#555555", ha="center", va="center", zorder=3) for x, y, label in page.labels]
+
+            # same margins as nx.draw
+            if len(page.node_xy) > 0:
+                (minx, miny), (maxx, maxy) = page.node_xy.min(axis=0), page.node_xy.max(axis=0)
+                padx, pady = 0.05 * (maxx - minx) or 1, 0.05 * (maxy - miny) or 1
+                self.ax.set_xlim(minx - padx, maxx + padx)
+                self.ax.set_ylim(miny - pady, maxy + pady)
+
+        self.edges.set_colors(page.edge_colors)
+        self.ax.set_title(page.title)
+        self.pdf.savefig(self.fig)
+        self.pages += 1
+
+    def close(self) -> None:
+        self.pdf.close()
+        plt.close(self.fig)
+
+    def __enter__(self) -> "PdfBatchRenderer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def render_pdf(pages: Iterable[PageData], filepath: str) -> int:
+    """
+    Writes all pages into one PDF, returns the number of pages
+    """
+    with PdfBatchRenderer(filepath) as renderer:
+        for page in pages:
+            renderer.add_page(page)
+        return renderer.pages
+
+
+def edge_colors(G: Graph, delays: Dict[Link, float], mincolor = -1, maxcolor = -1, scale: Literal["linear", "log"] = "linear") -> Tuple[float, float, List[Tuple]]:
+    """
+    Colors for the edges of a graph built by topo_to_graph(), in the order of G.edges(); see metric_colors().
+    Like edge_values(), both directions of an edge are combined to the larger value.
+    """
+    links = [origin for _, _, origin in G.edges(data="origin")]
+    forward = np.fromiter((delays.get(l, np.nan) for l in links), dtype=float, count=len(links))
+    backward = np.fromiter((delays.get(l.mirror(), np.nan) for l in links), dtype=float, count=len(links))
+    mincolor, maxcolor, colors = metric_colors(np.fmax(forward, backward), mincolor, maxcolor, scale)
+    return mincolor, maxcolor, [tuple(c) for c in colors]
+
+
+def edge_order(topo: Topology) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The undirected edges of the topology, in the order topo_to_graph() adds them (and stores as edge attribute "index"):
+    returns (forward, backward) link ids per edge; forward is the link seen first, backward its mirror (-1 if there is none)
+    """
+    core = topo.core
+    order = core.derived.get("visualization/edge_order")
+    if order is None:
+        keys = core.src.astype(np.int64) * core.num_nodes + core.dst
+        mirror_keys = core.dst.astype(np.int64) * core.num_nodes + core.src
+        sorter = np.argsort(keys)
+        found = sorter[np.minimum(np.searchsorted(keys, mirror_keys, sorter=sorter), max(0, len(keys) - 1))]
+        mirror = np.where(keys[found] == mirror_keys, found, -1) if len(keys) > 0 else found
+        forward = np.flatnonzero((mirror < 0) | (np.arange(core.num_links) < mirror))
+        order = (forward, mirror[forward])
+        core.derived["visualization/edge_order"] = order
+    return order
+
+
+def edge_values(topo: Topology, values: Union[Dict[Link, float], np.ndarray]) -> np.ndarray:
+    """
+    Combines both directions of each edge (see edge_order()) to the larger value, for simplicity.
+
+    :param values: per link, as dict or as array indexed by Link.index; links without a value are NaN
+    """
+    if isinstance(values, dict):
+        array = np.full(topo.core.num_links, np.nan)
+        array[np.fromiter((l.index for l in values), dtype=np.int64, count=len(values))] = np.fromiter(values.values(), dtype=float, count=len(values))
+        values = array
+    forward, backward = edge_order(topo)
+    return np.fmax(values[forward], np.where(backward >= 0, values[np.maximum(backward, 0)], np.nan))
+
+
+def metric_colors(values: np.ndarray, mincolor = -1, maxcolor = -1, scale: Literal["linear", "log"] = "linear") -> Tuple[float, float, np.ndarray]:
+    """
+    Maps values to RGB colors from green (mincolor) over yellow to red (maxcolor); NaN values are gray.
+
+    :param mincolor: lower border, the smallest value if -1; fix both borders to compare colors across pages
+    :param maxcolor: upper border, the largest value if -1
+    :param scale: "log" normalizes on a logarithmic scale (borders and values must then be positive)
+    returns (mincolor, maxcolor, colors as array of RGB rows)
+    """
+    values = np.asarray(values, dtype=float)
+    defined = values[~np.isnan(values)]
 
     # define green and red borders
-    ret = []
     if mincolor == -1:
-        mincolor = min(delays.values())
+        mincolor = float(defined.min()) if len(defined) > 0 else 0.0
     if maxcolor == -1:
-        maxcolor = max(delays.values())
+        maxcolor = float(defined.max()) if len(defined) > 0 else 0.0
 
-    # convert delay values to colors
-    for e in G.edges():
-        if mincolor == maxcolor:
-            pct = 0
-        else:
-            delay = delays["%s-%s" % (e[0], e[1])]
-            pct = (delay - mincolor) / (maxcolor - mincolor)
-        pctd = 1.0 - pct
-        r = min(1, pct * 2)
-        g = min(1, pctd * 2)
-        ret.append((r, g, 0))
+    if mincolor == maxcolor:
+        pct = np.zeros(len(values))
+    elif scale == "log":
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = (np.log(values) - np.log(mincolor)) / (np.log(maxcolor) - np.log(mincolor))
+    elif scale == "linear":
+        pct = (values - mincolor) / (maxcolor - mincolor)
+    else:
+        raise ValueError(f"unknown scale '{scale}'")
+    pct = np.clip(pct, 0, 1)
 
-    return mincolor, maxcolor, ret
+    colors = np.zeros((len(values), 3))
+    colors[:, 0] = np.minimum(1, pct * 2)
+    colors[:, 1] = np.minimum(1, (1 - pct) * 2)
+    colors[np.isnan(values)] = 0.67
+
+    return mincolor, maxcolor, colors
 
 
 def topo_to_graph(topo: Topology) -> Graph:
@@ -82,10 +224,10 @@ def topo_to_graph(topo: Topology) -> Graph:
         # save pointer to original object for easy access
         G.nodes[n.name]["origin"] = n
 
-    for l in topo.links:
-        if (l.n2.name, l.n1.name) not in G.edges:
-            G.add_edge(l.n1.name, l.n2.name)
-            G.edges[(l.n1.name, l.n2.name)]["origin"] = l
+    links = topo.links
+    for i, link_id in enumerate(edge_order(topo)[0].tolist()):
+        l = links[link_id]
+        G.add_edge(l.n1.name, l.n2.name, origin=l, index=i)
 
     return G
 
@@ -95,6 +237,112 @@ def graph_positions(G: Graph) -> dict:
     return nx.kamada_kawai_layout(G)
 
 
+LAYOUT_CACHE_SIZE = 32
+_layout_cache: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+
+# kamada_kawai is quadratic in the number of nodes, "auto" switches to the structural layout above this size
+AUTO_STRUCTURAL_NODES = 1000
+
+
+def layout_positions(topo: Topology, layout: Literal["auto", "kamada_kawai", "structural"] = "auto") -> dict:
+    """
+    Node positions by name, cached per topology fingerprint (node names and links), so rendering the same topology
+    several times (e.g. with different colorizations) computes the layout only once.
+    """
+    if layout == "auto":
+        layout = "structural" if len(topo.nodes) > AUTO_STRUCTURAL_NODES else "kamada_kawai"
+
+    key = (layout_fingerprint(topo), layout)
+    pos = _layout_cache.get(key)
+    if pos != None:
+        _layout_cache.move_to_end(key)
+        return pos
+
+    if layout == "kamada_kawai":
+        pos = graph_positions(topo_to_graph(topo))
+    elif layout == "structural":
+        pos = structural_layout(topo)
+    else:
+        raise ValueError(f"unknown layout '{layout}'")
+
+    _layout_cache[key] = pos
+    if len(_layout_cache) > LAYOUT_CACHE_SIZE:
+        _layout_cache.popitem(last=False)
+    return pos
+
+
+def layout_fingerprint(topo: Topology) -> str:
+    core = topo.core
+    h = hashlib.sha1()
+    h.update("\n".join(n.name for n in topo.nodes).encode("utf-8"))
+    h.update(core.src.tobytes())
+    h.update(core.dst.tobytes())
+    return h.hexdigest()
+
+
+def structural_layout(topo: Topology) -> dict:
+    """
+    Radial tree layout in linear time: every connected component is drawn around its center node,
+    nodes are placed on circles by hop distance, and each subtree of the BFS tree gets an angular sector
+    proportional to its number of leaves.
+
+    The factories build trees hanging off a small core (branches and hosts off the main line/ring, hosts off the
+    tree layers), so branches and host fans end up as separate spokes and only the core links cross the drawing.
+    """
+    core = topo.core
+    x = np.zeros(core.num_nodes)
+    y = np.zeros(core.num_nodes)
+    placed = np.zeros(core.num_nodes, dtype=bool)
+    offset = 0.0
+
+    for start in range(core.num_nodes):
+        if placed[start]:
+            continue
+
+        # center: middle of a longest shortest path found by two sweeps
+        dist, _, order = core.bfs(start)
+        a = int(order[-1])
+        dist, parent_link, order = core.bfs(a)
+        b = int(order[-1])
+        path = core.trace_path(parent_link, b)
+        root = int(core.dst[path[len(path) // 2 - 1]]) if len(path) > 1 else a
+
+        dist, parent_link, order = core.bfs(root)
+        depth = dist[order]
+        parent = np.where(parent_link[order] >= 0, core.src[np.maximum(parent_link[order], 0)], -1)
+        levels = np.searchsorted(depth, np.arange(depth[-1] + 2))
+
+        # leaves per subtree, bottom up
+        weight = np.zeros(core.num_nodes)
+        below = np.zeros(core.num_nodes)
+        for d in range(depth[-1], -1, -1):
+            nodes = order[levels[d]:levels[d + 1]]
+            weight[nodes] = np.where(below[nodes] > 0, below[nodes], 1)
+            if d > 0:
+                np.add.at(below, parent[levels[d]:levels[d + 1]], weight[nodes])
+
+        # angular sectors, top down; BFS discovers the children of a node consecutively
+        unit = 2 * np.pi / weight[root]
+        sector = np.zeros(core.num_nodes)
+        for d in range(1, depth[-1] + 1):
+            nodes = order[levels[d]:levels[d + 1]]
+            parents = parent[levels[d]:levels[d + 1]]
+            w = weight[nodes]
+            before = np.cumsum(w) - w
+            group_start = np.r_[True, parents[1:] != parents[:-1]]
+            before -= before[np.maximum.accumulate(np.where(group_start, np.arange(len(nodes)), 0))]
+            sector[nodes] = sector[parents] + before * unit
+
+        angle = sector[order] + weight[order] * unit / 2
+        radius = depth.astype(float)
+        x[order] = offset + radius * np.cos(angle)
+        y[order] = radius * np.sin(angle)
+        placed[order] = True
+        offset += 2 * depth[-1] + 2
+
+    return {n.name: (float(x[i]), float(y[i])) for i, n in enumerate(topo.nodes)}
+
+
 def convert_bps_to_str(bps: float) -> str:
     if bps > 1e9:
         return "%.2fGbit/s" % (bps / 1e9)
@@ -0,0 +1,209 @@
+"""
+Benchmarks the scenario generation pipeline stage by stage, from fixed seeds.
+
+z_benchmark_baseline.json holds the reference results, produced with the default sizes and repeats:
+
+    python z_benchmark.py --save z_benchmark_baseline.json
+
+Regenerate and commit it whenever a change is meant to alter the results. Peak memory (traced by tracemalloc)
+is comparable across machines, times only on similar hardware; so CI checks memory and only gross slowdowns:
+
+    python z_benchmark.py --baseline z_benchmark_baseline.json --time-tolerance 2
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import matplotlib
+matplotlib.use("Agg")
+import networkx as nx
+
+from import_export.json import to_json
+from lib.stream import Stream
+from stream_factory.create_streams import create_streams_for_topology
+from topology_factory.combine_topologies import combine_topologies
+from topology_factory.linear_branches import linear_branches
+from topology_factory.two_layer_tree import two_layer_tree
+from visualization.topology_visualization import visualize_topology, topo_to_graph, graph_positions, structural_layout
+
+# Benchmarked topologies: a linear backbone with branches combined with a two layer tree.
+# Node count is about main_length * (1 + branches * branch_length * (1 + hosts)) + l2_switches * (1 + hosts_per_l2switch)
+SIZES = {
+    "small": dict(main_length=4, branches_per_main_switch=1, branch_length=3, hosts_per_branch_switch=4, num_layer2_switches=4, hosts_per_l2switch=8,
+                  num_streams=200, num_paths=500, visualize=True),
+    "medium": dict(main_length=10, branches_per_main_switch=2, branch_length=4, hosts_per_branch_switch=6, num_layer2_switches=10, hosts_per_l2switch=16,
+                   num_streams=2000, num_paths=1000, visualize=True),
+    "10k": dict(main_length=50, branches_per_main_switch=2, branch_length=5, hosts_per_branch_switch=9, num_layer2_switches=50, hosts_per_l2switch=99,
+                num_streams=5000, num_paths=500, visualize=False),
+    "100k": dict(main_length=500, branches_per_main_switch=2, branch_length=5, hosts_per_branch_switch=9, num_layer2_switches=500, hosts_per_l2switch=99,
+                 num_streams=1000, num_paths=100, visualize=False),
+}
+
+# 8 priorities, in seconds
+GUARANTEES = (1e-3, 1e-3, 1e-3, 1e-3, 5e-4, 2e-4, 1e-4, 5e-5)
+
+SEED = 42
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.10
+# differences below these are noise, not regressions
+MIN_TIME_DELTA = 0.05  # s
+MIN_MEMORY_DELTA = 2**20  # bytes
+
+
+def pipeline(size: dict, workdir: Path) -> List[Callable[[dict], None]]:
+    """
+    The benchmarked stages, in order; every stage reads its inputs from and writes its results to a shared state dict.
+    """
+    def build_linear_branches(state):
+        state["linear"] = linear_branches(main_length=size["main_length"], branches_per_main_switch=size["branches_per_main_switch"], branch_length=size["branch_length"],
+                                          hosts_per_branch_switch=size["hosts_per_branch_switch"], main_link_speed=1e10, branch_link_speed=1e9, connect_to_ring=True, num_join_points=2)
+
+    def build_two_layer_tree(state):
+        state["tree"] = two_layer_tree(num_layer1_switches=2, num_layer2_switches=size["num_layer2_switches"], hosts_per_l2switch=size["hosts_per_l2switch"],
+                                       switch_link_speed=1e10, host_link_speed=1e9).reset_with_prefix("tree_")
+
+    def combine(state):
+        state["topo"] = combine_topologies(state["linear"], state["tree"], add_name_prefixes=False)
+
+    def shortest_path(state):
+        topo = state["topo"]
+        pairs = [random.sample(topo.hosts, 2) for _ in range(size["num_paths"])]
+        for n1, n2 in pairs:
+            topo.shortest_path(n1, n2)
+
+    def weighted_path(state):
+        topo = state["topo"]
+        pairs = [random.sample(topo.hosts, 2) for _ in range(size["num_paths"])]
+        for n1, n2 in pairs:
+            topo.shortest_path(n1, n2, "inverse_bandwidth")
+
+    def create_streams(state):
+        state["streams"] = create_streams_for_topology(state["topo"], num_streams=size["num_streams"], burst_range=[64 * 8, 1000 * 8], rate_range=[10e3, 50e6, "log"], prio_range=[4, 7])
+
+    def add_streams(state):
+        state["topo"].add_streams(state["streams"])
+
+    def update_guarantees(state):
+        state["topo"].update_guarantees_all_links(GUARANTEES)
+
+    def export_json(state):
+        to_json(state["topo"], str(workdir / "benchmark.json"))
+
+    def visualize(state):
+        topo = state["topo"]
+        bw_dict = {l: l.bandwidth for l in topo.links}
+        visualize_topology(topo, bw_dict, pos=state["pos"], filepath=str(workdir / "benchmark.pdf"), title="Benchmark")
+
+    def layout(state):
+        state["pos"] = graph_positions(topo_to_graph(state["topo"]))
+
+    def layout_structural(state):
+        structural_layout(state["topo"])
+
+    stages = [build_linear_branches, build_two_layer_tree, combine, shortest_path, weighted_path, create_streams, add_streams, update_guarantees, export_json, layout_structural]
+    if size["visualize"]:
+        stages += [layout, visualize]
+    return stages
+
+
+def run_pipeline(size: dict, workdir: Path, measure_memory: bool) -> Dict[str, float]:
+    """
+    Runs all stages once from a fixed seed; returns the duration (or the peak memory in bytes) per stage.
+    """
+    random.seed(SEED)
+    Stream.LAST_ID = -1
+    state = {}
+    results = {}
+
+    for stage in pipeline(size, workdir):
+        if measure_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            stage(state)
+            results[stage.__name__] = tracemalloc.get_traced_memory()[1] - base
+        else:
+            start = time.perf_counter()
+            stage(state)
+            results[stage.__name__] = time.perf_counter() - start
+
+    return results
+
+
+def benchmark(size_name: str, repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    returns {stage -> {"time": best of `repeat` runs in s, "peak_memory": in bytes}};
+    memory is measured in an extra run, as tracing slows down the timed runs
+    """
+    size = SIZES[size_name]
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        times = [run_pipeline(size, workdir, measure_memory=False) for _ in range(repeat)]
+
+        tracemalloc.start()
+        try:
+            memory = run_pipeline(size, workdir, measure_memory=True)
+        finally:
+            tracemalloc.stop()
+
+    return {stage: {"time": min(t[stage] for t in times), "peak_memory": memory[stage]} for stage in memory}
+
+
+def regressions(results: dict, baseline: dict, time_tolerance: float, memory_tolerance: float) -> List[str]:
+    found = []
+    for size_name, stages in results.items():
+        for stage, values in stages.items():
+            ref = baseline.get(size_name, {}).get(stage)
+            if ref == None:
+                continue
+            if values["time"] > ref["time"] * (1 + time_tolerance) and values["time"] - ref["time"] > MIN_TIME_DELTA:
+                found.append(f"{size_name}/{stage}: time {values['time']:.3f}s > {ref['time']:.3f}s (+{time_tolerance:.0%})")
+            if values["peak_memory"] > ref["peak_memory"] * (1 + memory_tolerance) and values["peak_memory"] - ref["peak_memory"] > MIN_MEMORY_DELTA:
+                found.append(f"{size_name}/{stage}: peak memory {values['peak_memory'] / 2**20:.1f}MiB > {ref['peak_memory'] / 2**20:.1f}MiB (+{memory_tolerance:.0%})")
+    return found
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scenario generation pipeline with fixed seeds.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium", "10k"], help="topology sizes to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per size, the fastest counts")
+    parser.add_argument("--save", default=None, help="write the results as JSON, e.g. to use them as baseline later")
+    parser.add_argument("--baseline", default=None, help="results of an earlier run (see --save), e.g. the committed z_benchmark_baseline.json; exit with 1 on regressions")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE, help="allowed relative slowdown per stage")
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE, help="allowed relative increase of the peak memory per stage")
+    args = parser.parse_args(args)
+
+    results = {}
+    for size_name in args.sizes:
+        print(f"Benchmarking size {size_name} ...")
+        results[size_name] = benchmark(size_name, args.repeat)
+        for stage, values in results[size_name].items():
+            print(f"  {stage:<22} {values['time']:>9.4f}s  {values['peak_memory'] / 2**20:>9.1f}MiB")
+
+    if args.save != None:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w") as file:
+            json.dump({"seed": SEED, "python": sys.version.split()[0], "networkx": nx.__version__, "results": results}, file, indent=4)
+        print(f"Saved results to {args.save}")
+
+    if args.baseline != None:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)["results"]
+        found = regressions(results, baseline, args.time_tolerance, args.memory_tolerance)
+        if len(found) > 0:
+            print(f"{len(found)} regression(s):")
+            for r in found:
+                print(f"  {r}")
+            return 1
+        print("No regressions")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,57 +1,57 @@
 import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
 
-from factory_profiles.scenario_factory_profiles import industrial_scenario, automotive_scenario
+from factory_profiles.scenario_factory_profiles import generate_scenario
 from lib.z_test_util import link, get_tmp_filepath
-from visualization.topology_visualization import topo_to_graph, visualize_topology, graph_positions
+from visualization.topology_visualization import prepare_page, render_pdf, layout_positions, PageData
 
 HOW_MANY = 20
 #SCENARIO = "industrial"
 SCENARIO = "automotive"
 SIZE = "big"
-PDFS = []
-REMOVE_SMALL_PDFs = True
+WORKERS = os.cpu_count()
+
+
+def scenario_pages(task) -> List[PageData]:
+    """
+    Generates one scenario and prepares its pages; runs in a worker process
+    """
+    i, seed = task
+    print(f"Generating topology {i+1}/{HOW_MANY} ({SCENARIO}, size {SIZE}, seed {seed}) ...")
+    topo = generate_scenario(SCENARIO, SIZE, seed)
+
+    JSON_FILE = get_tmp_filepath("problem_gen/json.json")
+    #to_json(topo, JSON_FILE)
+    #print(f"  Exported JSON to {link(JSON_FILE)}")
+
+    # computed once per topology, both colorizations share it
+    pos = layout_positions(topo)
+
+    pages = []
+    for colorization in ["bw", "burst"]:
+        # link color selection
+        # values per link index; bandwidths on a fixed log scale, so the pages of all scenarios compare directly
+        if colorization == "bw":
+            pages.append(prepare_page(topo, topo.core.bandwidths, pos=pos, title="Topology bandwidth overview", mincolor=1e8, maxcolor=1e10, scale="log"))
+        elif colorization == "burst":
+            bursts = topo.link_bursts.sum(axis=1) / topo.core.bandwidths * 1e9
+            pages.append(prepare_page(topo, bursts, pos=pos, title="Topology burst overview"))
+
+    #print(f"  -> centrality = {np.mean([x for x in nx.degree_centrality(G).values()])}")
+    #print(f"  -> betweenness = {np.mean([x for x in nx.betweenness_centrality(G).values()])}")
+    return pages
 
 
 if __name__ == '__main__':
-    for i in range(HOW_MANY):
-        print(f"Generating topology {i+1}/{HOW_MANY} ({SCENARIO}, size {SIZE}) ...")
-
-        if SCENARIO == "industrial":
-            topo = industrial_scenario(SIZE)
-        elif SCENARIO == "automotive":
-            topo = automotive_scenario()
-        else:
-            raise ValueError(f"scenario {SCENARIO} unknown")
-
-        JSON_FILE = get_tmp_filepath("problem_gen/json.json")
-        #to_json(topo, JSON_FILE)
-        #print(f"  Exported JSON to {link(JSON_FILE)}")
-
-        for colorization in ["bw", "burst"]:
-            PDF_FILE = get_tmp_filepath(f"problem_gen/pdf-{colorization}.pdf")
-            PDFS += [PDF_FILE]
-            pos = graph_positions(topo_to_graph(topo))
-
-            # link color selection
-            if colorization == "bw":
-                bw_dict = {l: l.bandwidth for l in topo.links}
-                visualize_topology(topo, bw_dict, pos=pos, filepath=PDF_FILE, title="Topology bandwidth overview")
-            elif colorization == "burst":
-                burst_dict = {l: sum([s.burst for s in topo.streams_per_link.get(l, dict()).values()]) / l.bandwidth * 1e9 for l in topo.links}
-                visualize_topology(topo, burst_dict, pos=pos, filepath=PDF_FILE, title="Topology burst overview")
-
-            #print(f"  Exported Visualization to {link(PDF_FILE)}")
-
-        #print(f"  -> centrality = {np.mean([x for x in nx.degree_centrality(G).values()])}")
-        #print(f"  -> betweenness = {np.mean([x for x in nx.betweenness_centrality(G).values()])}")
+    # every scenario gets its own seed, otherwise forked workers would continue from the same random state
+    tasks = [(i, random.getrandbits(64)) for i in range(HOW_MANY)]
 
     JOINED_PDF = get_tmp_filepath(f"problem_gen/pdf-test-{SCENARIO}-{SIZE}-{HOW_MANY}.pdf")
-    os.system(f"pdfunite {' '.join(PDFS)} {JOINED_PDF}")
-    print(f"United PDFs to {link(JOINED_PDF)} ...")
-
-    if REMOVE_SMALL_PDFs:
-        for pdf in PDFS:
-            os.remove(pdf)
+    with ProcessPoolExecutor(max_workers=WORKERS) as executor:
+        num_pages = render_pdf((page for pages in executor.map(scenario_pages, tasks) for page in pages), JOINED_PDF)
+    print(f"Rendered {num_pages} pages to {link(JOINED_PDF)} ...")
 
 
 